@@ -0,0 +1,60 @@
+'''
+File: __main__.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import argparse
+import os
+import sys
+
+ANALYZE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(argv):
+    sys.path.insert(0, ANALYZE_DIR)
+    from figures import FIGURES, run
+    from instrument import enable
+
+    parser = argparse.ArgumentParser(prog='python -m analyze', description='reproduce the figures of the paper')
+    parser.add_argument('figures', nargs='*', help=f'{", ".join(FIGURES)} or all')
+    parser.add_argument('--list', action='store_true', help='list the figures')
+    stage = parser.add_mutually_exclusive_group()
+    stage.add_argument('--calc-only', action='store_true', help='run the calc stages only (matplotlib is never imported)')
+    stage.add_argument('--plot-only', action='store_true', help='plot from the existing intermediate results')
+    parser.add_argument('--fast', action='store_true', help='draft rendering without LaTeX and AFM fonts')
+    parser.add_argument('--ext', default=None, help='file extension of the figures, e.g. .png (.pdf by default)')
+    parser.add_argument('--trace', default=None, metavar='PATH', help='write a Chrome trace of the hot paths and print a summary (ANALYZE_TRACE)')
+    parser.add_argument('--trace-memory', action='store_true', help='with --trace, peak memory of each span (slower)')
+    args = parser.parse_args(argv)
+
+    if args.list or not args.figures:
+        for name, figure in FIGURES.items():
+            print(f'{name:<20}{figure.description:<32}{figure.module}.py')
+        return 0
+
+    names = list(FIGURES) if 'all' in args.figures else args.figures
+    unknown = [n for n in names if n not in FIGURES]
+    if unknown:
+        parser.error(f'unknown figure: {", ".join(unknown)}')
+
+    stages = ('calc',) if args.calc_only else ('plot',) if args.plot_only else ('calc', 'plot')
+    if args.trace is not None:
+        enable(os.path.abspath(args.trace), args.trace_memory)
+    # the scripts use paths relative to the analyze directory
+    os.chdir(ANALYZE_DIR)
+    for name in names:
+        print(f'== {name}')
+        run(name, stages, True if args.fast else None, args.ext)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,265 @@
+'''
+File: acquisition.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import argparse
+import asyncio
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from bin_reader import write_bin
+from csv_reader import format_picoscope
+from field import AUTD_WIDTH, AUTD_HEIGHT, Medium, Z_DIR, autd_transducers, calc_pressure, focus_phases, grid_points
+from scan_plan import MotionModel, read_plan
+from phasor_table import HARMONICS, reduce_waveforms, write_table
+from synthetic import SOURCE_AMP, duty_amp, tone, write_cond
+
+# the devices are async objects with these coroutines; real drivers wrap their blocking calls with asyncio.to_thread
+#   robot:  move_to(x, y, z)
+#   scope:  capture() -> (samples [mV], dt [s])
+#   autd:   focus(x, y, z, duty), stop()
+
+
+class SimulatedRobot:
+    '''
+    moves in the time given by a scan_plan.MotionModel, multiplied by time_scale
+    '''
+
+    def __init__(self, model=None, position=(0., 0., 0.), time_scale=1.0):
+        self.model = MotionModel() if model is None else model
+        self.position = np.asarray(position, dtype=float)
+        self.time_scale = time_scale
+
+    async def move_to(self, x, y, z):
+        target = np.array([x, y, z], dtype=float)
+        await asyncio.sleep(float(self.model.move_time(np.linalg.norm(target - self.position))) * self.time_scale)
+        self.position = target
+
+
+class SimulatedAUTD:
+    def __init__(self, latency=1e-3, time_scale=1.0):
+        self.latency = latency
+        self.time_scale = time_scale
+        self.focal_pos = None
+        self.duty = 0
+
+    async def focus(self, x, y, z, duty):
+        await asyncio.sleep(self.latency * self.time_scale)
+        self.focal_pos = np.array([x, y, z], dtype=float)
+        self.duty = duty
+
+    async def stop(self):
+        await asyncio.sleep(self.latency * self.time_scale)
+        self.duty = 0
+
+
+class SimulatedScope:
+    '''
+    PicoScope capturing the field of the simulated AUTD3 array at the robot position:
+    the block itself (n samples at dt) plus a transfer latency
+    '''
+
+    def __init__(self, robot, autd, num_autd=(3, 3), temp=22.7, n=10000, dt=1e-7, latency=0.02, noise=2.0, time_scale=1.0, seed=0):
+        self.robot = robot
+        self.autd = autd
+        self.sources = autd_transducers(*num_autd)
+        self.medium = Medium(273.15 + temp, 40e3, 13)
+        self.n = n
+        self.dt = dt
+        self.latency = latency
+        self.noise = noise
+        self.time_scale = time_scale
+        self.rng = np.random.default_rng(seed)
+
+    def pressure(self, position):
+        if self.autd.duty == 0:
+            return 0j
+        phases = focus_phases(self.sources, self.autd.focal_pos, self.medium)
+        p = calc_pressure(self.sources, 1.0, phases, position[np.newaxis, :], self.medium, Z_DIR)[0]
+        return SOURCE_AMP * duty_amp(self.autd.duty) * p
+
+    async def capture(self):
+        p = self.pressure(self.robot.position)
+        await asyncio.sleep((self.n * self.dt + self.latency) * self.time_scale)
+        return tone(self.n, self.dt, np.abs(p), np.angle(p), self.noise, self.rng), self.dt
+
+
+def process(job):
+    '''
+    runs in a worker process: the phasor table row of a capture, and its csv text (gzip-compressed .bin when compress)
+    written to path unless the scan is reduced and the raw capture is not kept
+    '''
+    path, samples, dt, compress, keep_raw = job
+    if keep_raw:
+        text = format_picoscope(samples, dt)
+        if compress:
+            write_bin(path + '.bin', text)
+        else:
+            with open(path + '.csv', 'w') as f:
+                f.write(text)
+    return reduce_waveforms(samples, dt)[0]
+
+
+async def put(queue, item, consumer):
+    '''
+    queue.put that raises the error of the consumer once it died, instead of blocking forever on a full queue
+    '''
+    task = asyncio.ensure_future(queue.put(item))
+    await asyncio.wait([task, consumer], return_when=asyncio.FIRST_COMPLETED)
+    if not task.done():
+        task.cancel()
+        consumer.result()
+        raise RuntimeError('the consumer stopped before the end of the scan')
+
+
+def point_name(x, y, z):
+    return f'x{x:.3f}y{y:.3f}z{z:.3f}'
+
+
+async def acquire(robot, scope, points, settle, data_path, compress=False, executor=None, pipeline=True, queue_size=8, reduce=False, keep_every=None):
+    '''
+    measures points (M x 3) in order, sleeping settle [s] (scalar or per point) after each move.
+    with pipeline, formatting, compression, writing and 40 kHz extraction of a capture run on the executor
+    while the robot moves on, otherwise inline as in the measurement programs.
+    at most queue_size captures wait in memory.
+    with reduce, the phasors of every capture are written to phasors.csv and the raw captures only for every
+    keep_every-th point (none without keep_every). returns the 40 kHz components (M)
+    '''
+    loop = asyncio.get_running_loop()
+    settle = np.broadcast_to(np.asarray(settle, dtype=float), (len(points),))
+    rows = np.empty((len(points), 2 * HARMONICS + 2))
+    queue = asyncio.Queue(queue_size)
+
+    async def drain():
+        pending = set()
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                i, job = item
+                task = loop.run_in_executor(executor, process, job)
+                task.index = i
+                pending.add(task)
+                # bound the jobs in flight, so that the queue blocks the acquisition when the workers fall behind
+                if len(pending) >= queue_size:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for t in done:
+                        rows[t.index] = t.result()
+            for t in pending:
+                rows[t.index] = await t
+        finally:
+            # after a failure, the jobs still in flight are dropped and their errors retrieved
+            for t in pending:
+                if not t.done():
+                    t.cancel()
+                elif not t.cancelled():
+                    t.exception()
+
+    consumer = asyncio.create_task(drain()) if pipeline else None
+    try:
+        for i, (x, y, z) in enumerate(points):
+            await robot.move_to(x, y, z)
+            await asyncio.sleep(settle[i])
+            samples, dt = await scope.capture()
+            keep_raw = not reduce or (keep_every is not None and i % keep_every == 0)
+            job = (os.path.join(data_path, point_name(x, y, z)), samples, dt, compress, keep_raw)
+            if pipeline:
+                await put(queue, (i, job), consumer)
+            else:
+                rows[i] = process(job)
+        if pipeline:
+            await put(queue, None, consumer)
+            await consumer
+    finally:
+        # a device error leaves the consumer waiting on the queue
+        if consumer is not None and not consumer.done():
+            consumer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await consumer
+    if reduce:
+        ext = '.bin' if compress else '.csv'
+        write_table(data_path, [point_name(x, y, z) + ext for x, y, z in points], rows)
+    return rows[:, 0] + 1j * rows[:, 1]
+
+
+async def run(points, settle, data_path, compress, pipeline, workers, time_scale, model, latency, reduce=False, keep_every=None):
+    xc, yc = AUTD_WIDTH * 3 / 2, AUTD_HEIGHT * 3 / 2
+    robot = SimulatedRobot(model, points[0], time_scale)
+    autd = SimulatedAUTD(time_scale=time_scale)
+    scope = SimulatedScope(robot, autd, latency=latency, time_scale=time_scale)
+    write_cond(data_path, int(round(1 / scope.dt)), scope.n, 1.0, scope.medium.temperature - 273.15, 13, (xc, yc, points[0][2]))
+    await autd.focus(xc, yc, points[0][2], 10)
+    with ProcessPoolExecutor(workers) as executor:
+        start = time.perf_counter()
+        spectrum = await acquire(robot, scope, points, settle, data_path, compress, executor, pipeline, 2 * (workers or os.cpu_count()),
+                                 reduce, keep_every)
+        elapsed = time.perf_counter() - start
+    await autd.stop()
+    return spectrum, elapsed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='pipelined acquisition on simulated robot, PicoScope and AUTD3')
+    parser.add_argument('--plan', default=None, help='plan file of scan_plan.py; a square grid around the focus otherwise')
+    parser.add_argument('--points', type=int, default=100, help='points of the default grid')
+    parser.add_argument('--settle', type=float, default=None, help='s, overrides the settle of the plan (0.5 s without a plan)')
+    parser.add_argument('--compress', action='store_true', help='write gzip-compressed .bin files like the compressor')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--time-scale', type=float, default=1.0, help='scales every simulated device latency')
+    parser.add_argument('--scope-latency', type=float, default=0.02, help='s to transfer a block from the scope')
+    parser.add_argument('--reduce', action='store_true', help='write phasors.csv instead of the raw captures')
+    parser.add_argument('--keep-every', type=int, default=None, help='with --reduce, keep the raw capture of every n-th point')
+    parser.add_argument('--out', default=None, help='directory of the captures (a temporary one is removed otherwise)')
+    parser.add_argument('--sequential-only', action='store_true', help='skip the pipelined run')
+    args = parser.parse_args(argv)
+
+    model = MotionModel()
+    if args.plan is not None:
+        plan = read_plan(args.plan)
+        points = plan[['x [mm]', 'y [mm]', 'z [mm]']].to_numpy()
+        settle = plan['settle [ms]'].to_numpy() / 1000 if args.settle is None else args.settle
+    else:
+        xc, yc = AUTD_WIDTH * 3 / 2, AUTD_HEIGHT * 3 / 2
+        side = max(2, int(np.round(np.sqrt(args.points))))
+        points = grid_points((xc - (side - 1) / 2, xc + (side - 1) / 2), (yc - (side - 1) / 2, yc + (side - 1) / 2), (500, 500), 1.0)
+        settle = 0.5 if args.settle is None else args.settle
+    settle = np.asarray(settle, dtype=float) * args.time_scale
+
+    root = args.out if args.out is not None else tempfile.mkdtemp(prefix='analyze-acq-')
+    results = {}
+    try:
+        for pipeline in ([False] if args.sequential_only else [False, True]):
+            name = 'pipelined' if pipeline else 'sequential'
+            data_path = os.path.join(root, name)
+            os.makedirs(data_path, exist_ok=True)
+            spectrum, elapsed = asyncio.run(run(points, settle, data_path, args.compress, pipeline, args.workers,
+                                                args.time_scale, model, args.scope_latency, args.reduce, args.keep_every))
+            size = sum(os.path.getsize(os.path.join(data_path, f)) for f in os.listdir(data_path))
+            results[name] = {'time [s]': elapsed, 'points/s': len(points) / elapsed, 'max [Pa]': np.abs(spectrum).max() / np.sqrt(2),
+                             'size [kB]': size / 1e3}
+    finally:
+        if args.out is None:
+            shutil.rmtree(root, ignore_errors=True)
+    print(f'{len(points)} points')
+    print(pd.DataFrame(results).T.to_string(float_format=lambda v: f'{v:.3f}'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
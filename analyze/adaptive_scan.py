@@ -0,0 +1,249 @@
+'''
+File: adaptive_scan.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from field import AUTD_WIDTH, AUTD_HEIGHT, Medium, Z_DIR, autd_transducers, calc_pressure, focus_phases, grid_points, scan_range
+from scan_plan import MotionModel, cost, serpentine_order, tsp_order, plan, write_plan
+
+
+class AdaptiveGrid:
+    '''
+    amplitudes on the lattice of the full raster scan, measured only where needed.
+    the lattice is covered by coarse cells of coarse x coarse lattice steps; a cell is split in four
+    (its edge midpoints and centre are measured) while the amplitude varies across its corners by more than
+    grad_tol of the peak, or the centre of its parent deviated from the mean of the parent corners by more than curv_tol
+    '''
+
+    def __init__(self, x_range, y_range, resolution, coarse=8, grad_tol=0.05, curv_tol=0.02):
+        self.xs = scan_range(x_range, resolution)
+        self.ys = scan_range(y_range, resolution)
+        self.resolution = resolution
+        self.coarse = coarse
+        self.grad_tol = grad_tol
+        self.curv_tol = curv_tol
+        self.values = np.full((len(self.ys), len(self.xs)), np.nan)
+
+    def lattice(self, points):
+        '''
+        lattice indices (iy, ix) of points (M x 2, mm) and a mask of those on the lattice
+        '''
+        points = np.asarray(points, dtype=float)
+        ix = np.round((points[:, 0] - self.xs[0]) / self.resolution).astype(int)
+        iy = np.round((points[:, 1] - self.ys[0]) / self.resolution).astype(int)
+        on = (ix >= 0) & (ix < len(self.xs)) & (iy >= 0) & (iy < len(self.ys))
+        return iy, ix, on
+
+    def add(self, points, values):
+        '''
+        values of points; points off the lattice and non-finite values (points not measured) are ignored
+        '''
+        values = np.asarray(values, dtype=float)
+        iy, ix, on = self.lattice(points)
+        on &= np.isfinite(values)
+        self.values[iy[on], ix[on]] = values[on]
+
+    @property
+    def measured(self):
+        return int(np.count_nonzero(~np.isnan(self.values)))
+
+    def coarse_cells(self):
+        '''
+        cells (ix, iy, w, h) in lattice steps; the last row and column are narrower when coarse does not divide the lattice
+        '''
+        nx, ny = len(self.xs) - 1, len(self.ys) - 1
+        return [(i, j, min(self.coarse, nx - i), min(self.coarse, ny - j))
+                for j in range(0, max(ny, 1), self.coarse) for i in range(0, max(nx, 1), self.coarse)]
+
+    @staticmethod
+    def sub_points(cell):
+        i, j, w, h = cell
+        return [(y, x) for y in sorted({j, j + h // 2, j + h}) for x in sorted({i, i + w // 2, i + w})]
+
+    @staticmethod
+    def children(cell):
+        i, j, w, h = cell
+        xs = [(i, w // 2), (i + w // 2, w - w // 2)] if w > 1 else [(i, w)]
+        ys = [(j, h // 2), (j + h // 2, h - h // 2)] if h > 1 else [(j, h)]
+        return [(x, y, cw, ch) for y, ch in ys for x, cw in xs]
+
+    def corners(self, cell):
+        i, j, w, h = cell
+        return self.values[[j, j, j + h, j + h], [i, i + w, i, i + w]]
+
+    def leaves(self):
+        '''
+        (cell, curvature of its parent) of the cells not split yet; a cell counts as split when all its sub points are measured
+        '''
+        peak = np.nanmax(self.values)
+        leaves = []
+        todo = [(cell, 0.0) for cell in self.coarse_cells()]
+        while todo:
+            cell, curv = todo.pop()
+            i, j, w, h = cell
+            if (w > 1 or h > 1) and all(not np.isnan(self.values[p]) for p in self.sub_points(cell)):
+                centre = self.values[j + h // 2, i + w // 2]
+                curv = abs(centre - self.corners(cell).mean()) / peak
+                todo.extend((child, curv) for child in self.children(cell))
+            else:
+                leaves.append((cell, curv))
+        return leaves
+
+    def next_batch(self):
+        '''
+        positions (M x 2, mm) to measure next: the coarse grid first, then the sub points of the cells to refine.
+        empty when the map is converged
+        '''
+        missing = set()
+        for cell in self.coarse_cells():
+            i, j, w, h = cell
+            missing.update(p for p in [(j, i), (j, i + w), (j + h, i), (j + h, i + w)] if np.isnan(self.values[p]))
+        if not missing:
+            peak = np.nanmax(self.values)
+            for cell, curv in self.leaves():
+                i, j, w, h = cell
+                if w <= 1 and h <= 1:
+                    continue
+                v = self.corners(cell)
+                if (v.max() - v.min()) / peak > self.grad_tol or curv > self.curv_tol:
+                    missing.update(p for p in self.sub_points(cell) if np.isnan(self.values[p]))
+        iy, ix = np.array(sorted(missing), dtype=int).reshape(-1, 2).T
+        return np.stack([self.xs[ix], self.ys[iy]], axis=1)
+
+    def dense(self, method='cubic'):
+        '''
+        map on the full lattice, interpolated from the measured points
+        '''
+        from scipy.interpolate import griddata
+        iy, ix = np.nonzero(~np.isnan(self.values))
+        gy, gx = np.meshgrid(self.ys, self.xs, indexing='ij')
+        z = griddata((self.xs[ix], self.ys[iy]), self.values[iy, ix], (gx, gy), method=method)
+        if method != 'nearest' and np.isnan(z).any():
+            z = np.where(np.isnan(z), griddata((self.xs[ix], self.ys[iy]), self.values[iy, ix], (gx, gy), method='nearest'), z)
+        return z
+
+    def to_frame(self, values):
+        '''
+        same layout as xy.csv: y as index, x as columns
+        '''
+        return pd.DataFrame(values, index=self.ys, columns=self.xs)
+
+
+def load_measured(grid, data_paths):
+    '''
+    amplitudes measured so far in the scan directories of xy_field (one per run of a plan)
+    '''
+    from xy_field import calc_rms
+    for data_path in data_paths:
+        # a batch covers only its own points, the rest of its map is NaN
+        rms = calc_rms(data_path).stack().dropna()
+        ys, xs = [rms.index.get_level_values(k).to_numpy(dtype=float) for k in range(2)]
+        grid.add(np.stack([xs, ys], axis=1), rms.to_numpy())
+
+
+def focus_field(xs, ys, z, num_autd=(3, 3), temp=22.7, duty=10):
+    '''
+    RMS pressure [Pa] of the focus of xy_field on the xs x ys grid, simulated with field.py
+    '''
+    from synthetic import SOURCE_AMP, duty_amp
+    medium = Medium(273.15 + temp, 40e3, 13)
+    sources = autd_transducers(*num_autd)
+    focus = np.array([AUTD_WIDTH * num_autd[0] / 2, AUTD_HEIGHT * num_autd[1] / 2, z])
+    points = grid_points((xs[0], xs[-1]), (ys[0], ys[-1]), (z, z), xs[1] - xs[0])
+    p = SOURCE_AMP * duty_amp(duty) * calc_pressure(sources, 1.0, focus_phases(sources, focus, medium), points, medium, Z_DIR)
+    return np.abs(p).reshape(len(ys), len(xs)) / np.sqrt(2)
+
+
+def simulate(grid, truth, z, model, start, noise=0.0, seed=0):
+    '''
+    runs the adaptive scan against a known map; each batch is visited in a 2-opt order from where the last one ended
+    '''
+    rng = np.random.default_rng(seed)
+    batches = []
+    seconds = 0.0
+    pos = np.asarray(start, dtype=float)
+    while True:
+        batch = grid.next_batch()
+        if len(batch) == 0:
+            break
+        iy, ix, _ = grid.lattice(batch)
+        grid.add(batch, truth[iy, ix] + rng.normal(0, noise, len(batch)))
+        points = np.column_stack([batch, np.full(len(batch), z)])
+        points = points[tsp_order(points, pos)]
+        seconds += cost(points, model, pos)['total [s]']
+        pos = points[-1]
+        batches.append(len(batch))
+    return batches, seconds
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='adaptive refinement of the xy scan around the focus')
+    sub = parser.add_subparsers(dest='mode', required=True)
+    xc, yc = AUTD_WIDTH * 3 / 2, AUTD_HEIGHT * 3 / 2
+    nxt = sub.add_parser('next', help='next batch from the scans measured so far')
+    nxt.add_argument('data_paths', nargs='*', help='xy_field scan directories; none for the first (coarse) batch')
+    nxt.add_argument('--plan', default='adaptive_plan.csv', help='plan file of the next batch for xy_field')
+    nxt.add_argument('--map', default='xy_adaptive.csv', help='interpolated map in the layout of xy.csv')
+    sim = sub.add_parser('simulate', help='offline run on the focus simulated with field.py')
+    sim.add_argument('--noise', type=float, default=0.0, help='Pa')
+    for p in [nxt, sim]:
+        p.add_argument('--x', type=float, nargs=2, default=[xc - 50, xc + 50], metavar=('MIN', 'MAX'))
+        p.add_argument('--y', type=float, nargs=2, default=[yc - 50, yc + 50], metavar=('MIN', 'MAX'))
+        p.add_argument('--z', type=float, default=500)
+        p.add_argument('--resolution', type=float, default=1.0)
+        p.add_argument('--coarse', type=int, default=8, help='lattice steps between the points of the first batch')
+        p.add_argument('--grad-tol', type=float, default=0.05)
+        p.add_argument('--curv-tol', type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    grid = AdaptiveGrid(args.x, args.y, args.resolution, args.coarse, args.grad_tol, args.curv_tol)
+    start = [xc, yc, args.z]
+    model = MotionModel()
+
+    if args.mode == 'next':
+        load_measured(grid, args.data_paths)
+        batch = grid.next_batch()
+        if grid.measured > 0:
+            grid.to_frame(grid.dense()).to_csv(args.map)
+            print(f'{grid.measured} points measured, map written to {args.map}')
+        if len(batch) == 0:
+            print('converged')
+            return 0
+        points = np.column_stack([batch, np.full(len(batch), args.z)])
+        iy, ix, _ = grid.lattice(batch)
+        write_plan(args.plan, plan(points, 'tsp', start, model, iy * len(grid.xs) + ix))
+        print(f'{len(batch)} points in the next batch, plan written to {args.plan}')
+        return 0
+
+    truth = focus_field(grid.xs, grid.ys, args.z)
+    batches, seconds = simulate(grid, truth, args.z, model, start, args.noise)
+    recon = grid.dense()
+    peak = truth.max()
+    err = np.abs(recon - truth) / peak
+    full = grid_points(args.x, args.y, (args.z, args.z), args.resolution)
+    raster = cost(full[serpentine_order(full)], model, start)['total [s]']
+    iy, ix = np.unravel_index(np.argmax(recon), recon.shape)
+    ty, tx = np.unravel_index(np.argmax(truth), truth.shape)
+
+    print(f'batches: {", ".join(map(str, batches))}')
+    print(f'points: {grid.measured} / {truth.size} ({100 * grid.measured / truth.size:.1f} %)')
+    print(f'estimated scan time: {seconds / 60:.1f} min (full serpentine raster {raster / 60:.1f} min)')
+    print(f'reconstruction error: max {100 * err.max():.2f} %, rms {100 * np.sqrt(np.mean(err ** 2)):.3f} % of the peak')
+    print(f'peak: {recon.max():.1f} Pa at ({grid.xs[ix]:.1f}, {grid.ys[iy]:.1f}), true {peak:.1f} Pa at ({grid.xs[tx]:.1f}, {grid.ys[ty]:.1f})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -4,40 +4,31 @@ Project: python
 Created Date: 04/06/2020
 Author: Shun Suzuki
 -----
-Last Modified: 22/02/2021
+Last Modified: 17/10/2026
 Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
 -----
 Copyright (c) 2020 Hapis Lab. All rights reserved.
 
 '''
 
-import math
-import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 import os
 
-from afc.python.afc import UniformSystem
-from afc.python.afc import SphereWaveSource, T4010A1  # NOQA
-from afc.python.afc import CpuCalculator, GpuCalculator, GridAreaBuilder, PressureFieldBuffer, PowerFieldBuffer  # NOQA
-from afc.python.afc import Optimizer
-
+from field import Medium, transducer_grid, grid_points, phase_resolution_sweep
 from shared import setup_pyplot
 
-
-def to_digital(system, digit):
-    for source in system.get_wave_sources():
-        phase = source.phase / (2.0 * math.pi)
-        phase = (math.floor(phase * digit + 0.5) % digit) / digit
-        source.phase = 2.0 * math.pi * phase
+DPI = 300
+ext = '.pdf'
+N = 256
 
 
-def plot():
+def calc():
     NUM_TRANS_X = 18 * 3
     NUM_TRANS_Y = 14 * 3
     TRANS_SIZE = 10.16
     FREQUENCY = 40e3
     TEMPERATURE = 287.6843037730883
-    Z_DIR = np.array([0., 0., 1.])  # sound source direction
     R = 0
     Z = 500.0
 
@@ -49,40 +40,24 @@ def plot():
     Y_RANGE = (focal_pos[1] - R / 2, focal_pos[1] + R / 2)
     RESOLUTION = 1.0
 
-    # Initialize calculator
-    calculator = CpuCalculator()
-
-    # initialize position, direction, amplitude and phase of each sound source
-    system = UniformSystem(TEMPERATURE)
-    for y in range(NUM_TRANS_Y):
-        for x in range(NUM_TRANS_X):
-            pos = np.array([TRANS_SIZE * x, TRANS_SIZE * y, 0.])
-            source = T4010A1(pos, Z_DIR, 1.0, 0.0, FREQUENCY)
-            system.add_wave_source(source)
-
-    system.info()
-    system.info_of_source(0)
+    # initialize position, amplitude and phase of each sound source
+    medium = Medium(TEMPERATURE, FREQUENCY)
+    sources = transducer_grid(NUM_TRANS_X, NUM_TRANS_Y, TRANS_SIZE)
+    amps = np.ones(len(sources))
+    print(f'sources: {len(sources)}, wavenumber [1/mm]: {medium.wavenumber}, attenuation [Np/mm]: {medium.attenuation}')
 
     # Generate observe area, units are mm
-    observe_area = GridAreaBuilder()\
-        .x_range(X_RANGE)\
-        .y_range(Y_RANGE)\
-        .z_at(Z)\
-        .resolution(RESOLUTION)\
-        .generate()
-
-    # Generate target field buffer
-    field = PressureFieldBuffer()
-
-    N = 256
-    results = np.zeros(N - 1)
-    for i in range(2, N + 1):
-        Optimizer.focus(system, focal_pos)
-        to_digital(system, i)
-        result = calculator.calculate(system, observe_area, field)
-        results[i - 2] = result[0]
+    observe_area = grid_points(X_RANGE, Y_RANGE, (Z, Z), RESOLUTION)
+
+    results = phase_resolution_sweep(sources, amps, [focal_pos], observe_area, medium, np.arange(2, N + 1))[0, :, 0]
 
     results /= results[-1]
+    pd.DataFrame({'amp': results}, index=np.arange(2, N + 1)).to_csv('amp_vs_resolution.csv')
+
+
+def plot():
+    import matplotlib.pyplot as plt
+    results = pd.read_csv('amp_vs_resolution.csv', index_col=0)['amp'].to_numpy()
 
     fig = plt.figure(figsize=(6, 6), dpi=DPI)
     axes = fig.add_subplot()
@@ -123,6 +98,5 @@ if __name__ == '__main__':
     os.makedirs('plot', exist_ok=True)
     setup_pyplot()
 
-    DPI = 300
-    ext = '.pdf'
+    calc()
     plot()
@@ -0,0 +1,211 @@
+'''
+File: benchmark.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from shared import get_40kHz_amp, get_40kHz_phase, get_40kHz_spectrum, directivity, attenuation_coef
+from csv_reader import read_picoscope, write_picoscope
+from single_trans_phase_duty import phase_delays
+from individual_diff import phase_residuals
+from synthetic import synthetic_waveforms
+
+SAMPLE_RATE = 10e6  # Hz
+N_SAMPLES = 10000
+PERIOD = 25e-6
+ELEMENTS_PER_CAPTURE = 1000  # angles / temperatures per capture for the element-wise functions
+GRID = (14, 18)  # transducers of a device (y, x)
+BASELINE_FILE = 'benchmark_baseline.json'
+RESULTS_FILE = 'benchmark_results.json'
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(f):
+        BENCHMARKS[name] = f
+        return f
+    return register
+
+
+def waveforms(n):
+    return synthetic_waveforms(n, N_SAMPLES, 1.0 / SAMPLE_RATE)
+
+
+# each benchmark prepares its input for n captures and returns (run, items, bytes processed by run)
+
+@benchmark('csv_parse')
+def bench_csv_parse(n, work_dir):
+    data_dir = os.path.join(work_dir, f'csv{n}')
+    if not os.path.isdir(data_dir):
+        os.makedirs(data_dir)
+        for i, sig in enumerate(waveforms(n)):
+            write_picoscope(os.path.join(data_dir, f'duty{i}.csv'), sig, 1.0 / SAMPLE_RATE)
+    paths = [os.path.join(data_dir, f'duty{i}.csv') for i in range(n)]
+    size = sum(os.path.getsize(p) for p in paths)
+    return lambda: [read_picoscope(p, n=N_SAMPLES) for p in paths], n, size
+
+
+@benchmark('get_40kHz_amp')
+def bench_amp(n, _):
+    samples = waveforms(n)
+    return lambda: [get_40kHz_amp(s, 1.0 / SAMPLE_RATE) for s in samples], n, samples.nbytes
+
+
+@benchmark('get_40kHz_phase')
+def bench_phase(n, _):
+    samples = waveforms(n)
+    return lambda: [get_40kHz_phase(s, 1.0 / SAMPLE_RATE) for s in samples], n, samples.nbytes
+
+
+@benchmark('get_40kHz_spectrum')
+def bench_spectrum(n, _):
+    samples = waveforms(n)
+    return lambda: get_40kHz_spectrum(samples, 1.0 / SAMPLE_RATE), n, samples.nbytes
+
+
+@benchmark('directivity')
+def bench_directivity(n, _):
+    theta = np.random.default_rng(0).uniform(-np.pi, np.pi, n * ELEMENTS_PER_CAPTURE)
+    return lambda: directivity(theta), theta.size, theta.nbytes
+
+
+@benchmark('attenuation_coef')
+def bench_attenuation(n, _):
+    t = np.random.default_rng(0).uniform(273.15, 313.15, n * ELEMENTS_PER_CAPTURE)
+    return lambda: attenuation_coef(40e3, 30, 1, 1, t), t.size, t.nbytes
+
+
+@benchmark('phase_xcorr')
+def bench_xcorr(n, _):
+    samples = waveforms(n)
+    return lambda: phase_delays(samples[0], samples, 1.0 / SAMPLE_RATE, PERIOD), n, samples.nbytes
+
+
+@benchmark('plane_fit')
+def bench_plane_fit(n, _):
+    ny, nx = GRID
+    devices = max(1, -(-n // (ny * nx)))
+    rng = np.random.default_rng(0)
+    xs = np.arange(nx) * 10.16
+    ys = np.arange(ny) * 10.16
+    x, y = np.meshgrid(xs, ys)
+    grids = 0.01 * x - 0.02 * y + rng.normal(0, 0.3, (devices, ny, nx))
+    grids[:, 6, [3, 4, 8]] = np.nan  # missing transducers of AUTD3
+    return lambda: phase_residuals(xs, ys, grids), grids.size, grids.nbytes
+
+
+def measure(run, repeat):
+    '''
+    best wall time [s] of repeat runs, and peak traced memory [B] of one more run
+    '''
+    best = float('inf')
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_all(names, sizes, repeat=3):
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix='analyze-bench-')
+    try:
+        for name in names:
+            for n in sizes:
+                run, items, nbytes = BENCHMARKS[name](n, work_dir)
+                t, peak = measure(run, repeat)
+                results[f'{name}/{n}'] = {
+                    'time [s]': t,
+                    'items/s': items / t,
+                    'MB/s': nbytes / t / 1e6,
+                    'peak [MB]': peak / 1e6,
+                }
+                print(f'{name}/{n}: {t:.4f} s')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    '''
+    ratio of time to the baseline of each benchmark, and names slower than the baseline by more than tolerance
+    '''
+    ratios = {}
+    regressions = []
+    for key, r in results.items():
+        if key not in baseline:
+            continue
+        ratios[key] = r['time [s]'] / baseline[key]['time [s]']
+        if ratios[key] > 1 + tolerance:
+            regressions.append(key)
+    return ratios, regressions
+
+
+def print_table(results, ratios, regressions):
+    print(f'{"benchmark":<28}{"time [s]":>12}{"items/s":>14}{"MB/s":>10}{"peak [MB]":>11}{"vs base":>9}')
+    for key, r in results.items():
+        ratio = f'{ratios[key]:.2f}' if key in ratios else '-'
+        flag = '  REGRESSION' if key in regressions else ''
+        print(f'{key:<28}{r["time [s]"]:>12.4f}{r["items/s"]:>14.4g}{r["MB/s"]:>10.1f}{r["peak [MB]"]:>11.1f}{ratio:>9}{flag}')
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(), 'processor': platform.processor()}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='benchmarks of the analysis hot paths on synthetic data')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000], help='numbers of captures')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown relative to the baseline')
+    args = parser.parse_args(argv)
+
+    results = run_all(args.only, args.sizes, args.repeat)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    ratios, regressions = compare(results, baseline, args.tolerance)
+    print_table(results, ratios, regressions)
+
+    with open(RESULTS_FILE, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'environment': environment(), 'results': baseline}, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
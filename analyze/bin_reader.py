@@ -0,0 +1,93 @@
+'''
+File: bin_reader.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import gzip
+import io
+import struct
+
+# .NET BinaryFormatter (MS-NRBF) records written when serializing a single string
+SERIALIZED_STREAM_HEADER = 0
+BINARY_OBJECT_STRING = 6
+MESSAGE_END = 11
+HEADER = struct.Struct('<Biiii')  # record type, root id, header id, major and minor version
+OBJECT_ID = struct.Struct('<i')
+
+
+def read_length(buf, pos):
+    '''
+    7-bit encoded length prefix of a string, returns (length, position after the prefix)
+    '''
+    length = 0
+    for shift in range(0, 35, 7):
+        b = buf[pos]
+        pos += 1
+        length |= (b & 0x7F) << shift
+        if b < 0x80:
+            return length, pos
+    raise ValueError('invalid string length prefix')
+
+
+def decode_string(buf):
+    '''
+    the string serialized by BinaryFormatter.Serialize(stream, string)
+    '''
+    record, _, _, _, _ = HEADER.unpack_from(buf, 0)
+    if record != SERIALIZED_STREAM_HEADER:
+        raise ValueError('not a BinaryFormatter stream')
+    pos = HEADER.size
+    if buf[pos] != BINARY_OBJECT_STRING:
+        raise ValueError(f'root object is not a string (record type {buf[pos]})')
+    pos += 1 + OBJECT_ID.size
+    length, pos = read_length(buf, pos)
+    if pos + length > len(buf):
+        raise ValueError('truncated string record')
+    return buf[pos:pos + length].decode('utf-8')
+
+
+def encode_string(text):
+    data = text.encode('utf-8')
+    prefix = bytearray()
+    n = len(data)
+    while n >= 0x80:
+        prefix.append((n & 0x7F) | 0x80)
+        n >>= 7
+    prefix.append(n)
+    return (HEADER.pack(SERIALIZED_STREAM_HEADER, 1, -1, 1, 0) + bytes([BINARY_OBJECT_STRING]) + OBJECT_ID.pack(1)
+            + bytes(prefix) + data + bytes([MESSAGE_END]))
+
+
+def read_bin(path):
+    '''
+    text of a .bin file written by the compressor or PicoCnt.MeasureAndSave(compress: true), decoded in memory
+    '''
+    with gzip.open(path, 'rb') as f:
+        return decode_string(f.read())
+
+
+def decode_bin(data):
+    '''
+    text of the bytes of a .bin file, e.g. read from an archive member
+    '''
+    return decode_string(gzip.decompress(data))
+
+
+def write_bin(path, text):
+    '''
+    .bin file readable by uncompressor.exe
+    '''
+    with gzip.open(path, 'wb') as f:
+        f.write(encode_string(text))
+
+
+def open_bin(path):
+    return io.StringIO(read_bin(path), newline=None)
@@ -0,0 +1,239 @@
+'''
+File: build.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from figures import FIGURES, run
+from instrument import enable
+from result_cache import input_fingerprint
+from shared import FAST_RENDER
+
+ANALYZE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join('.cache', 'build.json')
+
+
+def local_sources(module):
+    '''
+    source files of the module and of the analyze modules it imports, transitively
+    '''
+    sources = []
+    todo = [module]
+    while todo:
+        name = todo.pop()
+        path = os.path.join(ANALYZE_DIR, name + '.py')
+        if path in sources or not os.path.isfile(path):
+            continue
+        sources.append(path)
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                todo.extend(a.name for a in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module is not None and node.level == 0:
+                todo.append(node.module)
+    return sorted(sources)
+
+
+def file_digest(path):
+    '''
+    intermediates are small, hashing their content lets a rerun calc that wrote the same result keep the plot
+    '''
+    if not os.path.isfile(path):
+        return 'missing'
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class Stage:
+    '''
+    calc or plot stage of a figure; plot depends on calc when the figure has both
+    '''
+
+    def __init__(self, figure, stage, deps):
+        self.figure = figure
+        self.stage = stage
+        self.deps = deps
+
+    @property
+    def name(self):
+        return f'{self.figure}.{self.stage}'
+
+    def outputs(self, ext):
+        figure = FIGURES[self.figure]
+        if self.stage == 'calc':
+            return list(figure.intermediates)
+        return [os.path.join('plot', name + ext) for name in figure.plots]
+
+    def signature(self, signatures, fast, ext):
+        '''
+        hash of everything the stage reads: code, scan directories or intermediates, render options and upstream stages
+        '''
+        figure = FIGURES[self.figure]
+        h = hashlib.sha256()
+        h.update(self.name.encode())
+        for path in local_sources(figure.module) + [os.path.join(ANALYZE_DIR, 'figures.py')]:
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        if self.stage == 'calc':
+            for data_path in figure.data:
+                h.update((input_fingerprint(data_path) if os.path.isdir(data_path) else 'missing').encode())
+        else:
+            for path in figure.intermediates:
+                h.update(file_digest(path).encode())
+            h.update(json.dumps({'fast': fast, 'ext': ext}).encode())
+        for dep in self.deps:
+            h.update(signatures[dep].encode())
+        return h.hexdigest()
+
+
+def stages_of(names, stages=('calc', 'plot')):
+    graph = {}
+    for name in names:
+        figure = FIGURES[name]
+        deps = []
+        if 'calc' in stages and figure.calc is not None:
+            graph[f'{name}.calc'] = Stage(name, 'calc', [])
+            deps = [f'{name}.calc']
+        if 'plot' in stages and figure.plot is not None:
+            graph[f'{name}.plot'] = Stage(name, 'plot', deps)
+    return graph
+
+
+def load_state():
+    if not os.path.isfile(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = STATE_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def run_stage(figure, stage, fast, ext, processes):
+    '''
+    runs in a worker process; the pools of the stage get processes workers
+    '''
+    os.environ['ANALYZE_PROCESSES'] = str(processes)
+    os.chdir(ANALYZE_DIR)
+    if ANALYZE_DIR not in sys.path:
+        sys.path.insert(0, ANALYZE_DIR)
+    start = time.perf_counter()
+    try:
+        run(figure, (stage,), fast, ext)
+    except Exception:
+        return False, time.perf_counter() - start, traceback.format_exc()
+    return True, time.perf_counter() - start, ''
+
+
+def build(names, stages=('calc', 'plot'), jobs=None, force=False, fast=False, ext='.pdf'):
+    '''
+    runs the stages of the figures on a pool of processes in dependency order,
+    skipping the stages whose signature is unchanged since the last successful run and whose outputs exist.
+    returns the names of the stages that failed or could not run
+    '''
+    fast = fast or FAST_RENDER
+    graph = stages_of(names, stages)
+    state = load_state()
+    signatures = {}
+    done = set()
+    failed = []
+    running = {}
+
+    def ready():
+        return [s for s in graph.values()
+                if s.name not in done and s.name not in running.values() and s.name not in failed
+                and all(d in done or d not in graph for d in s.deps)]
+
+    # every stage starts its own pool for parsing, so the cores are split between the stages that can run at once
+    jobs = jobs or os.cpu_count()
+    processes = max(1, os.cpu_count() // min(jobs, max(1, len(graph))))
+
+    with ProcessPoolExecutor(jobs) as executor:
+        while True:
+            # an up-to-date stage may release its dependents right away
+            batch = ready()
+            while batch:
+                for s in batch:
+                    signatures[s.name] = s.signature(signatures, fast, ext)
+                    outputs = s.outputs(ext)
+                    if not force and state.get(s.name) == signatures[s.name] and all(os.path.isfile(p) for p in outputs):
+                        print(f'{s.name}: up to date')
+                        done.add(s.name)
+                        continue
+                    print(f'{s.name}: started')
+                    running[executor.submit(run_stage, s.figure, s.stage, fast, ext, processes)] = s.name
+                batch = ready()
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                ok, elapsed, err = future.result()
+                if not ok:
+                    print(f'{name}: failed after {elapsed:.1f} s\n{err}')
+                    failed.append(name)
+                    state.pop(name, None)
+                    continue
+                print(f'{name}: done in {elapsed:.1f} s')
+                done.add(name)
+                state[name] = signatures[name]
+                save_state(state)
+
+    skipped = [s for s in graph if s not in done and s not in failed]
+    for name in skipped:
+        print(f'{name}: skipped, an upstream stage failed')
+    return failed + skipped
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='build the figures in parallel, rerunning only the stages whose inputs changed')
+    parser.add_argument('figures', nargs='*', default=['all'], help=f'{", ".join(FIGURES)} or all')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (all cores by default)')
+    stage = parser.add_mutually_exclusive_group()
+    stage.add_argument('--calc-only', action='store_true')
+    stage.add_argument('--plot-only', action='store_true')
+    parser.add_argument('--force', action='store_true', help='rerun every stage')
+    parser.add_argument('--fast', action='store_true', help='draft rendering without LaTeX and AFM fonts')
+    parser.add_argument('--ext', default='.pdf')
+    parser.add_argument('--trace', default=None, metavar='PATH', help='write a Chrome trace of all workers and print a summary (ANALYZE_TRACE)')
+    parser.add_argument('--trace-memory', action='store_true', help='with --trace, peak memory of each span (slower)')
+    args = parser.parse_args(argv)
+
+    names = list(FIGURES) if 'all' in args.figures else args.figures
+    unknown = [n for n in names if n not in FIGURES]
+    if unknown:
+        parser.error(f'unknown figure: {", ".join(unknown)}')
+    stages = ('calc',) if args.calc_only else ('plot',) if args.plot_only else ('calc', 'plot')
+    if args.trace is not None:
+        enable(os.path.abspath(args.trace), args.trace_memory)
+
+    os.chdir(ANALYZE_DIR)
+    failed = build(names, stages, args.jobs, args.force, args.fast, args.ext)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
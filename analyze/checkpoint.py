@@ -0,0 +1,116 @@
+'''
+File: checkpoint.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import hashlib
+import os
+import time
+import numpy as np
+import pandas as pd
+
+CHECKPOINT_DIR = os.environ.get('ANALYZE_CHECKPOINT_DIR', os.path.join('.cache', 'checkpoints'))
+
+# modules that read a waveform file and extract its 40 kHz component
+EXTRACT_SOURCES = ['shared.py', 'loader.py', 'csv_reader.py', 'bin_reader.py', 'checkpoint.py']
+
+
+def code_version(sources):
+    h = hashlib.sha256()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for source in sources:
+        with open(os.path.join(base, os.path.basename(source)), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def cond_digest(data_path):
+    '''
+    digest of cond.txt and of the extraction code: the spectra of a checkpoint are only valid for both
+    '''
+    h = hashlib.sha256()
+    with open(os.path.join(data_path, 'cond.txt'), 'rb') as f:
+        h.update(f.read())
+    h.update(code_version(EXTRACT_SOURCES).encode())
+    return h.hexdigest()
+
+
+def stat_files(data_path, paths):
+    '''
+    (size, mtime [ns]) of each file; files that disappeared get size -1
+    '''
+    sizes = np.full(len(paths), -1, dtype=np.int64)
+    mtimes = np.zeros(len(paths), dtype=np.int64)
+    for i, path in enumerate(paths):
+        try:
+            st = os.stat(os.path.join(data_path, path))
+        except OSError:
+            continue
+        sizes[i] = st.st_size
+        mtimes[i] = st.st_mtime_ns
+    return sizes, mtimes
+
+
+class Checkpoint:
+    '''
+    complex 40 kHz component of every waveform file already processed in a scan directory, so that a scan
+    in progress (or an interrupted analysis) only processes new files. a file is processed again when its
+    size or mtime changes, and everything is discarded when cond.txt or the extraction code changes.
+    the checkpoint is kept under CHECKPOINT_DIR so the data directory (and its mtime) is never touched.
+    '''
+
+    def __init__(self, data_path, digest, records):
+        self.path = data_path
+        self.digest = digest
+        self.records = records
+
+    @staticmethod
+    def file_path(data_path):
+        key = hashlib.sha256(os.path.abspath(data_path).encode()).hexdigest()[:32]
+        return os.path.join(CHECKPOINT_DIR, key + '.pkl')
+
+    @classmethod
+    def load(cls, data_path):
+        digest = cond_digest(data_path)
+        path = cls.file_path(data_path)
+        if os.path.isfile(path):
+            cached = pd.read_pickle(path)
+            if cached['digest'] == digest:
+                return cls(data_path, digest, cached['records'])
+        records = pd.DataFrame({'size': np.empty(0, dtype=np.int64), 'mtime': np.empty(0, dtype=np.int64),
+                                'spectrum': np.empty(0, dtype=np.complex128)}, index=pd.Index([], name='path'))
+        return cls(data_path, digest, records)
+
+    def save(self):
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        path = self.file_path(self.path)
+        tmp_path = path + '.tmp'
+        pd.to_pickle({'digest': self.digest, 'records': self.records}, tmp_path)
+        os.replace(tmp_path, path)
+
+    def pending(self, paths, settle=0.0):
+        '''
+        returns (ready, pending, sizes, mtimes): ready masks the files that exist and were not modified within
+        the last settle seconds (they may still be written), pending masks the ready files not yet processed
+        '''
+        paths = pd.Index(paths)
+        sizes, mtimes = stat_files(self.path, paths)
+        ready = (sizes >= 0) & (mtimes <= (time.time_ns() - int(settle * 1e9)))
+        known = self.records.reindex(paths)
+        done = (known['size'].to_numpy() == sizes) & (known['mtime'].to_numpy() == mtimes)
+        return ready, ready & ~done, sizes, mtimes
+
+    def update(self, paths, sizes, mtimes, spectrum):
+        new = pd.DataFrame({'size': sizes, 'mtime': mtimes, 'spectrum': spectrum}, index=pd.Index(paths, name='path'))
+        self.records = pd.concat([self.records.drop(new.index, errors='ignore'), new])
+
+    def spectrum(self, paths):
+        return self.records.loc[list(paths), 'spectrum'].to_numpy()
@@ -0,0 +1,146 @@
+'''
+File: csv_reader.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import itertools
+import os
+import numpy as np
+from bin_reader import open_bin
+from instrument import count, enabled, span
+
+PICO_COLUMN = '  A Max [mV]'
+TEK_HEADER_LINES = 32  # header entries of Tektronix TBS csv only appear in the first lines
+CHUNK = 65536
+
+
+def parse_lines(lines, usecols, dtype):
+    return np.loadtxt(lines, delimiter=',', usecols=usecols, dtype=dtype, ndmin=2 if isinstance(usecols, tuple) else 1)
+
+
+def iter_chunks(f, usecols, dtype, chunk):
+    while True:
+        lines = list(itertools.islice(f, chunk))
+        if len(lines) == 0:
+            return
+        yield parse_lines(lines, usecols, dtype)
+
+
+def open_picoscope(path):
+    '''
+    text of a PicoScope csv, or of a compressed .bin decoded in memory
+    '''
+    return open_bin(path) if path.endswith('.bin') else open(path)
+
+
+def read_picoscope_columns(f):
+    return f.readline().rstrip('\r\n').split(',')
+
+
+def parse_picoscope(f, column=PICO_COLUMN, dtype=np.float32):
+    '''
+    samples of one column of PicoScope csv text read from an open file object, e.g. an archive member
+    '''
+    idx = read_picoscope_columns(f).index(column)
+    return parse_lines(f, idx, dtype)
+
+
+def iter_picoscope(path, column=PICO_COLUMN, dtype=np.float32, chunk=CHUNK):
+    '''
+    samples of one column of a PicoScope csv (or .bin), chunk lines at a time
+    '''
+    with open_picoscope(path) as f:
+        idx = read_picoscope_columns(f).index(column)
+        yield from iter_chunks(f, idx, dtype, chunk)
+
+
+def read_picoscope(path, column=PICO_COLUMN, dtype=np.float32, n=None):
+    '''
+    samples of one column of a PicoScope csv (or .bin); pass the sample length n (cond.txt) to fill a preallocated array
+    '''
+    with span('parse'):
+        samples = _read_picoscope(path, column, dtype, n)
+        if enabled():
+            count(files=1, bytes=os.path.getsize(path), samples=len(samples))
+    return samples
+
+
+def _read_picoscope(path, column, dtype, n):
+    if n is None:
+        with open_picoscope(path) as f:
+            return parse_picoscope(f, column, dtype)
+
+    out = np.empty(n, dtype=dtype)
+    c = 0
+    for values in iter_picoscope(path, column, dtype):
+        out[c:c + len(values)] = values
+        c += len(values)
+    return out[:c]
+
+
+def format_picoscope(samples, dt, column=PICO_COLUMN):
+    '''
+    text in the PicoScope csv layout (time [ns] and one column [mV]), e.g. for synthetic data
+    '''
+    t = np.arange(len(samples)) * dt * 1e9
+    lines = '\n'.join(f'{ti:.1f},{vi:.4f}' for ti, vi in zip(t.tolist(), np.asarray(samples).tolist()))
+    return f'Time [ns],{column}\n{lines}\n'
+
+
+def write_picoscope(path, samples, dt, column=PICO_COLUMN):
+    with open(path, 'w') as f:
+        f.write(format_picoscope(samples, dt, column))
+
+
+def parse_tektronix_header(lines):
+    header = {}
+    for line in lines:
+        cols = line.split(',')
+        if len(cols) < 2 or cols[0] == '':
+            continue
+        try:
+            header[cols[0]] = float(cols[1])
+        except ValueError:
+            header[cols[0]] = cols[1]
+    return header
+
+
+def read_tektronix_header(path):
+    '''
+    metadata in columns 0-2 of a Tektronix csv, e.g. 'Record Length', 'Sample Interval', 'Trigger Point'
+    '''
+    with open(path) as f:
+        return parse_tektronix_header(itertools.islice(f, TEK_HEADER_LINES))
+
+
+def iter_tektronix(path, dtype=np.float32, chunk=CHUNK):
+    '''
+    (time [s], value) of a Tektronix csv, chunk lines at a time
+    '''
+    with open(path) as f:
+        for data in iter_chunks(f, (3, 4), dtype, chunk):
+            yield data[:, 0], data[:, 1]
+
+
+def read_tektronix(path, dtype=np.float32):
+    '''
+    header, time [s] and value of a Tektronix csv, filled into arrays preallocated from 'Record Length'
+    '''
+    header = read_tektronix_header(path)
+    n = int(header['Record Length'])
+    t = np.empty(n, dtype=dtype)
+    v = np.empty(n, dtype=dtype)
+    c = 0
+    for tc, vc in iter_tektronix(path, dtype):
+        t[c:c + len(tc)] = tc
+        v[c:c + len(vc)] = vc
+        c += len(tc)
+    return header, t[:c], v[:c]
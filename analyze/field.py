@@ -0,0 +1,192 @@
+'''
+File: field.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import hashlib
+import os
+import numpy as np
+from shared import directivity, attenuation_coef
+
+TRANS_SIZE = 10.16  # mm
+AUTD_WIDTH = 192.0  # mm
+AUTD_HEIGHT = 151.4  # mm
+NUM_TRANS_X = 18
+NUM_TRANS_Y = 14
+Z_DIR = np.array([0., 0., 1.])
+PROPAGATION_CACHE_DIR = os.path.join('.cache', 'propagation')
+
+
+def sound_speed(temperature):
+    '''
+    speed of sound [mm/s] in air at temperature [K]
+    '''
+    k = 1.403
+    M = 28.966e-3  # kg/mol
+    R = 8.314462
+    return np.sqrt(k * R * temperature / M) * 1e3
+
+
+def transducer_grid(num_x, num_y, pitch=TRANS_SIZE, origin=(0., 0., 0.)):
+    '''
+    positions (N x 3) of num_x x num_y transducers, x fastest
+    '''
+    x, y = np.meshgrid(np.arange(num_x) * pitch, np.arange(num_y) * pitch)
+    return np.stack([x.ravel(), y.ravel(), np.zeros(x.size)], axis=1) + np.asarray(origin)
+
+
+def is_missing(tx, ty):
+    '''
+    AUTD3 has no transducer at these positions (screw holes)
+    '''
+    return (ty == 1) and (tx in (1, 2, 16))
+
+
+def autd_transducers(num_x, num_y):
+    '''
+    positions (N x 3) of the 249 transducers of each of num_x x num_y AUTD3 devices, in the order of the measurement programs
+    '''
+    local = np.array([[tx * TRANS_SIZE, ty * TRANS_SIZE, 0.]
+                      for ty in range(NUM_TRANS_Y) for tx in range(NUM_TRANS_X) if not is_missing(tx, ty)])
+    return np.concatenate([local + [dx * AUTD_WIDTH, dy * AUTD_HEIGHT, 0.] for dy in range(num_y) for dx in range(num_x)])
+
+
+def scan_range(r, resolution):
+    n = int(np.floor((r[1] - r[0]) / resolution + 1e-9)) + 1
+    return r[0] + resolution * np.arange(n)
+
+
+def grid_points(x_range, y_range, z_range, resolution):
+    '''
+    observation points (M x 3) on a grid, x fastest; pass (v, v) to fix an axis at v
+    '''
+    xs = scan_range(x_range, resolution)
+    ys = scan_range(y_range, resolution)
+    zs = scan_range(z_range, resolution)
+    z, y, x = np.meshgrid(zs, ys, xs, indexing='ij')
+    return np.stack([x.ravel(), y.ravel(), z.ravel()], axis=1)
+
+
+class Medium:
+    def __init__(self, temperature, frequency=40e3, humidity=30.0, pressure=1.0):
+        self.temperature = temperature
+        self.frequency = frequency
+        self.humidity = humidity
+        self.pressure = pressure
+        self.wavenumber = 2.0 * np.pi * frequency / sound_speed(temperature)  # 1/mm
+        self.attenuation = attenuation_coef(frequency, humidity, pressure, pressure, temperature)  # Np/mm
+
+
+def propagation(sources, points, medium, direction=Z_DIR):
+    '''
+    transfer matrix (M x N) from N T4010A1 transducers at sources to M points:
+    D(theta) exp(-alpha r) / r exp(-ikr)
+    '''
+    diff = points[:, np.newaxis, :] - sources[np.newaxis, :, :]
+    r = np.linalg.norm(diff, axis=2)
+    cos = diff @ direction / r
+    theta = np.arccos(np.clip(cos, -1.0, 1.0))
+    d = directivity(theta)
+    return d * np.exp(-medium.attenuation * r) / r * np.exp(-1j * medium.wavenumber * r)
+
+
+def calc_pressure(sources, amps, phases, points, medium, direction=Z_DIR, chunk=4096):
+    '''
+    complex acoustic pressure at points; propagation is evaluated chunk points at a time to bound memory
+    '''
+    q = np.asarray(amps) * np.exp(1j * np.asarray(phases))
+    p = np.empty(len(points), dtype=np.complex128)
+    for s in range(0, len(points), chunk):
+        p[s:s + chunk] = propagation(sources, points[s:s + chunk], medium, direction) @ q
+    return p
+
+
+class PropagationMatrix:
+    '''
+    propagation matrix (M x N) of a fixed source layout and observation grid.
+    it is computed once and kept as a memory-mapped .npy file in cache_dir, keyed by the geometry and medium,
+    so that evaluating a drive pattern is a single mat-vec
+    '''
+
+    def __init__(self, sources, points, medium, direction=Z_DIR, cache_dir=PROPAGATION_CACHE_DIR, chunk=4096):
+        self.sources = np.ascontiguousarray(sources, dtype=np.float64)
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        self.medium = medium
+        self.direction = np.asarray(direction, dtype=np.float64)
+        self.chunk = chunk
+
+        if cache_dir is None:
+            self.G = self.compute(np.empty((len(self.points), len(self.sources)), dtype=np.complex128))
+            return
+
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, self.key() + '.npy')
+        if not os.path.isfile(path):
+            tmp_path = path + '.tmp.npy'
+            G = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.complex128, shape=(len(self.points), len(self.sources)))
+            self.compute(G).flush()
+            del G
+            os.replace(tmp_path, path)
+        self.G = np.load(path, mmap_mode='r')
+
+    def key(self):
+        h = hashlib.sha256()
+        for a in [self.sources, self.points, self.direction]:
+            h.update(str(a.shape).encode())
+            h.update(a.tobytes())
+        m = self.medium
+        h.update(repr((m.frequency, m.temperature, m.humidity, m.pressure)).encode())
+        return h.hexdigest()[:32]
+
+    def compute(self, G):
+        for s in range(0, len(self.points), self.chunk):
+            G[s:s + self.chunk] = propagation(self.sources, self.points[s:s + self.chunk], self.medium, self.direction)
+        return G
+
+    def pressure(self, amps, phases):
+        '''
+        complex pressure (M) for one drive pattern, or (R x M) for R patterns given as (R x N) arrays
+        '''
+        q = np.asarray(amps) * np.exp(1j * np.asarray(phases))
+        if q.ndim == 1:
+            return self.G @ q
+        return q @ self.G.T
+
+
+def focus_phases(sources, focal_pos, medium):
+    '''
+    phases to focus at focal_pos, in [0, 2pi)
+    '''
+    r = np.linalg.norm(sources - focal_pos, axis=1)
+    return np.mod(medium.wavenumber * r, 2.0 * np.pi)
+
+
+def to_digital(phases, digit):
+    phase = np.asarray(phases) / (2.0 * np.pi)
+    phase = np.mod(np.floor(phase * digit + 0.5), digit) / digit
+    return 2.0 * np.pi * phase
+
+
+def phase_resolution_sweep(sources, amps, focal_points, points, medium, digits, direction=Z_DIR, progress=None, matrix=None):
+    '''
+    |p| (F x R x M) at points when focusing on each of F focal_points with phases quantized to each of R digits.
+    the propagation matrix is computed (or loaded) once and every resolution is evaluated as one matrix product
+    '''
+    if matrix is None:
+        matrix = PropagationMatrix(sources, points, medium, direction)
+    digits = np.asarray(digits)[:, np.newaxis]
+    results = np.empty((len(focal_points), len(digits), len(points)))
+    for f, focal_pos in enumerate(focal_points):
+        phases = to_digital(focus_phases(sources, focal_pos, medium)[np.newaxis, :], digits)
+        results[f] = np.abs(matrix.pressure(amps, phases))
+        if progress is not None:
+            progress(f + 1, len(focal_points))
+    return results
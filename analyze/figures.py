@@ -0,0 +1,77 @@
+'''
+File: figures.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import importlib
+import os
+from instrument import span
+
+
+class Figure:
+    '''
+    calc and plot stages of a figure script; stages take the imported module.
+    data are the scan directories read by calc, intermediates the files calc writes for plot,
+    and plots the names of the figures written to plot/
+    '''
+
+    def __init__(self, description, module, calc=None, plot=None, data=(), intermediates=(), plots=()):
+        self.description = description
+        self.module = module
+        self.calc = calc
+        self.plot = plot
+        self.data = list(data)
+        self.intermediates = list(intermediates)
+        self.plots = list(plots)
+
+
+FIGURES = {
+    'directivity': Figure('Fig. 4', 'directivity_t4010a1', plot=lambda m: m.plot(), plots=['t4010a1_dir']),
+    'lpf': Figure('Fig. 6 and Fig. 7', 'lpf-silent', plot=lambda m: m.plot(), plots=['lpf_filter', 'phase_filtered']),
+    'single': Figure('Fig. 8 and Fig. 9', 'single_trans_phase_duty',
+                     calc=lambda m: m.calc('./raw_data/single_amp', './raw_data/single_input', './raw_data/single_phase'),
+                     plot=lambda m: (m.duty('./raw_data/single_amp', './raw_data/single_input'), m.phase('./raw_data/single_phase')),
+                     data=['./raw_data/single_amp', './raw_data/single_input', './raw_data/single_phase'],
+                     plots=['measured_amp_input', 'measured_phase']),
+    'xy': Figure('Fig. 11', 'xy_field', calc=lambda m: m.calc('./raw_data/xy'), plot=lambda m: m.plot(80),
+                 data=['./raw_data/xy'], intermediates=['xy.csv'], plots=['xy']),
+    'saturation': Figure('Fig. 12', 'saturation', calc=lambda m: m.calc('./raw_data/saturation'),
+                         plot=lambda m: [m.duty('./raw_data/saturation', z) for z in (150, 300, 500)],
+                         data=['./raw_data/saturation'], plots=['saturation_z150', 'saturation_z300', 'saturation_z500']),
+    'amp_vs_resolution': Figure('Fig. 13(a)', 'amp_vs_resolution', calc=lambda m: m.calc(), plot=lambda m: m.plot(),
+                                intermediates=['amp_vs_resolution.csv'], plots=['amp_vs_resolution']),
+    'pos_vs_resolution': Figure('Fig. 13(b)', 'pos_vs_resolution', calc=lambda m: m.calc(), plot=lambda m: m.plot(),
+                                intermediates=['pos_vs_argmax.csv'], plots=['pos_vs_resolution']),
+    'individual': Figure('Fig. 14', 'individual_diff', calc=lambda m: m.calc('./raw_data/individual'), plot=lambda m: m.plot(),
+                         data=['./raw_data/individual'], intermediates=['individual_amp.csv', 'individual_phase.csv'],
+                         plots=['amp_individual_diff', 'phase_individual_diff']),
+    'synchronization': Figure('inter-device skew and jitter', 'synchronization', calc=lambda m: m.analyze(),
+                              data=['../data/synchronization'], intermediates=['synchronization.csv']),
+}
+
+
+def run(name, stages=('calc', 'plot'), fast=None, ext=None):
+    '''
+    run the stages of a figure from the analyze directory; matplotlib is only imported when a plot stage runs
+    '''
+    figure = FIGURES[name]
+    module = importlib.import_module(figure.module)
+    if ext is not None:
+        module.ext = ext
+    if 'calc' in stages and figure.calc is not None:
+        with span(f'{name}.calc'):
+            figure.calc(module)
+    if 'plot' in stages and figure.plot is not None:
+        with span(f'{name}.plot'):
+            from shared import setup_pyplot
+            os.makedirs('plot', exist_ok=True)
+            setup_pyplot(fast)
+            figure.plot(module)
@@ -4,7 +4,7 @@ Project: analyze
 Created Date: 19/02/2021
 Author: Shun Suzuki
 -----
-Last Modified: 22/02/2021
+Last Modified: 17/10/2026
 Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
 -----
 Copyright (c) 2021 Hapis Lab. All rights reserved.
@@ -12,57 +12,56 @@ Copyright (c) 2021 Hapis Lab. All rights reserved.
 '''
 
 
-from shared import setup_pyplot, get_40kHz_amp, print_progress, get_40kHz_phase
+from shared import setup_pyplot
+from loader import load_scan
+from scan_index import get_index
+from waveform_store import open_store
+from phasor_table import open_table
+from result_cache import cached
+from instrument import timed
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import os
-import glob
-import re
-from scipy.stats import norm
-from scipy.optimize import curve_fit
 
+DPI = 300
+ext = '.pdf'
 
-def count_transducers(data_path):
-    total = 0
-    for dev_dir in glob.glob(os.path.join(data_path, '*')):
-        for tr_dir in glob.glob(os.path.join(dev_dir, '*')):
-            total += 1
 
-    return total
+def count_transducers(data_path):
+    store = open_store(data_path)
+    if store is None:
+        store = open_table(data_path)
+    if store is not None:
+        return len(store.index.loc[store.index['dev'] >= 0, ['dev', 'tr']].drop_duplicates())
+    return len(get_index(data_path).transducers())
 
 
-def get_amp_data(data_path, total):
-    cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
-    sample_rate = cond.at[0, 1]
+def calc_amp_data(data_path, settle=0.0):
+    cond, _, spectrum = load_scan(data_path, 'xyz', where=lambda keys: keys['z'].astype(int) == 200, settle=settle)
     mV_per_Pa = cond.at[2, 1]
-    dt = 1.0 / sample_rate
-
-    p = re.compile(r'x([+-]?\d+\.?\d+?)y([+-]?\d+\.?\d+?)z([+-]?\d+\.?\d+?).csv')
 
     results = pd.DataFrame(columns=['amp'])
-    c = 0
-    for dev_dir in glob.glob(os.path.join(data_path, '*')):
-        for tr_dir in glob.glob(os.path.join(dev_dir, '*')):
-            for filepath in glob.glob(os.path.join(tr_dir, '*')):
-                m = p.match(filepath.split(os.path.sep)[-1])
-                if m is None:
-                    continue
-
-                z = int(float(m.group(3)))
-                if z != 200:
-                    continue
-
-                df = pd.read_csv(filepath_or_buffer=filepath, sep=",")
-                sound = df['  A Max [mV]']
-                results.at[c, 'amp'] = get_40kHz_amp(sound, dt) / mV_per_Pa / np.sqrt(2)
-                c += 1
-                print_progress(c, total)
-    print()
+    results['amp'] = np.abs(spectrum) / mV_per_Pa / np.sqrt(2)
+    return results
+
+
+def get_amp_data(data_path):
+    results = cached('individual_amp', [data_path], {'freq': 40e3, 'z': 200}, lambda: calc_amp_data(data_path), [__file__])
     results.to_csv('individual_amp.csv')
 
 
+def calc_partial(data_path, settle=1.0):
+    '''
+    writes individual_amp.csv from the transducers measured so far and returns their number
+    '''
+    results = calc_amp_data(data_path, settle)
+    results.to_csv('individual_amp.csv')
+    return len(results)
+
+
 def plot_hist_amp():
+    import matplotlib.pyplot as plt
+    from scipy.stats import norm
     df = pd.read_csv(filepath_or_buffer='individual_amp.csv', sep=',', index_col=0)
     x = df.values
     print(x.min(), x.max())
@@ -98,106 +97,60 @@ def plot_hist_amp():
     fig.savefig(os.path.join('plot', 'amp_individual_diff' + ext), bbox_inches='tight', pad_inches=0)
 
 
-def surf2d(xy, a, b, d):
-    x, y = xy[0:2]
-    return a * x + b * y + d
-
-
-def surf2d_fit(xy, a, b, d):
-    return surf2d(xy, a, b, d).ravel()
-
-
-def process_phase_data_dev(dev_dir, cond):
-    sample_rate = cond.at[0, 1]
-    dt = 1.0 / sample_rate
-
-    p = re.compile(r'x([+-]?\d+\.?\d+?)y([+-]?\d+\.?\d+?)z([+-]?\d+\.?\d+?).csv')
-    x_axis = []
-    y_axis = []
-    for tr_dir in glob.glob(os.path.join('./raw_data/individual/dev0', '*')):
-        for filepath in glob.glob(os.path.join(tr_dir, '*')):
-            m = p.match(filepath.split(os.path.sep)[-1])
-            if m is None:
-                continue
-
-            if int(float(m.group(3))) != 200:
-                continue
-
-            x = float(m.group(1))
-            y = float(m.group(2))
-
-            x_axis.append(x)
-            y_axis.append(y)
-
-    x_axis = np.array(sorted(set(x_axis)))
-    y_axis = np.array(sorted(set(y_axis)))
-
-    results = pd.DataFrame(columns=x_axis, index=y_axis)
-    for tr_dir in glob.glob(os.path.join('./raw_data/individual/dev0', '*')):
-        for filepath in glob.glob(os.path.join(tr_dir, '*')):
-            m = p.match(filepath.split(os.path.sep)[-1])
-            if m is None:
-                continue
+def get_phase_grids(data_path):
+    '''
+    (devices, x, y, phases) with the phases at z = 200 of every device as a dense (D x ny x nx) grid, NaN where not measured
+    '''
+    _, keys, spectrum = load_scan(data_path, 'xyz', where=lambda keys: (keys['dev'] >= 0) & (keys['z'].astype(int) == 200))
 
-            if int(float(m.group(3))) != 200:
-                continue
+    devices, d = np.unique(keys['dev'].to_numpy(), return_inverse=True)
+    xs, ix = np.unique(keys['x'].to_numpy(), return_inverse=True)
+    ys, iy = np.unique(keys['y'].to_numpy(), return_inverse=True)
+    grids = np.full((len(devices), len(ys), len(xs)), np.nan)
+    grids[d, iy, ix] = np.angle(spectrum)
+    return devices, xs, ys, grids
 
-            x = float(m.group(1))
-            y = float(m.group(2))
 
-            df = pd.read_csv(filepath_or_buffer=filepath, sep=",")
-            sound = df['  A Max [mV]']
+@timed('fit')
+def fit_phase_planes(xs, ys, grids):
+    '''
+    least squares planes a x + b y + d (D x 3) of each grid, ignoring NaN, solved for all grids at once
+    '''
+    mask = ~np.isnan(grids)
+    x, y = np.meshgrid(xs, ys)
+    A = np.stack([x, y, np.ones_like(x)], axis=-1)  # ny x nx x 3
+    AtA = np.einsum('dij,ijk,ijl->dkl', mask, A, A)
+    Atb = np.einsum('dij,ijk->dk', np.where(mask, grids, 0.0), A)
+    return (np.linalg.pinv(AtA) @ Atb[..., np.newaxis])[..., 0]  # pinv: lstsq solution also for degenerate layouts
 
-            results.at[y, x] = get_40kHz_phase(sound, dt)
 
-    x_fit = []
-    y_fit = []
-    phase_fit = []
-    for col in results.columns:
-        for row in results.index:
-            if np.isnan(results.at[row, col]):
-                continue
-            x_fit.append(col)
-            y_fit.append(row)
-            phase_fit.append(results.at[row, col])
+def phase_residuals(xs, ys, grids):
+    '''
+    measured phases minus the fitted plane of each grid, wrapped into [-pi, pi), flattened in (dev, y, x) order
+    '''
+    popt = fit_phase_planes(xs, ys, grids)
+    x, y = np.meshgrid(xs, ys)
+    planes = popt[:, 0, None, None] * x + popt[:, 1, None, None] * y + popt[:, 2, None, None]
+    residuals = np.mod(grids - planes + np.pi, 2 * np.pi) - np.pi
+    return residuals[~np.isnan(grids)]
 
-    x_fit = np.array(x_fit)
-    y_fit = np.array(y_fit)
-    phase_fit = np.array(phase_fit)
-    popt, pcov = curve_fit(surf2d_fit, (x_fit, y_fit), phase_fit)
 
-    for col in results.columns:
-        for row in results.index:
-            if np.isnan(results.at[row, col]):
-                continue
-            x = float(col)
-            y = float(row)
-            phase = results.at[row, col] - surf2d((x, y), *popt)
-            results.at[row, col] = phase
-
-    return np.array(list(map(lambda x: float(x), filter(lambda x: not np.isnan(x), results.values.flatten()))))
-
-
-def get_phase_data(data_path, total):
-    p = re.compile(r'dev(\d+)')
-    cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
-    phases = np.array([])
-    print_progress(len(phases), total)
-    for dev_dir in glob.glob(os.path.join(data_path, '*')):
-        m = p.match(dev_dir.split(os.path.sep)[-1])
-        if m is None:
-            continue
-        phases = np.concatenate([phases, process_phase_data_dev(dev_dir, cond)])
-        print_progress(len(phases), total)
-    print()
+def calc_phase_data(data_path):
+    _, xs, ys, grids = get_phase_grids(data_path)
 
     results = pd.DataFrame(columns=['phase'])
-    results['phase'] = phases
+    results['phase'] = phase_residuals(xs, ys, grids)
+    return results
 
+
+def get_phase_data(data_path):
+    results = cached('individual_phase', [data_path], {'freq': 40e3, 'z': 200}, lambda: calc_phase_data(data_path), [__file__])
     results.to_csv('individual_phase.csv')
 
 
 def plot_hist_phase():
+    import matplotlib.pyplot as plt
+    from scipy.stats import norm
     df = pd.read_csv(filepath_or_buffer='individual_phase.csv', sep=',', index_col=0)
     x = df.values
     print(x.min(), x.max())
@@ -233,19 +186,22 @@ def plot_hist_phase():
     fig.savefig(os.path.join('plot', 'phase_individual_diff' + ext), bbox_inches='tight', pad_inches=0)
 
 
-if __name__ == '__main__':
-    os.makedirs('plot', exist_ok=True)
-    setup_pyplot()
+def calc(data_path):
+    print('transducers:', count_transducers(data_path))
+    print('amp')
+    get_amp_data(data_path)
+    print('phase')
+    get_phase_data(data_path)
 
-    DPI = 300
-    ext = '.pdf'
-    data_path = './raw_data/individual'
-    total = count_transducers(data_path)
 
-    print('amp')
-    get_amp_data(data_path, total)
+def plot():
     plot_hist_amp()
-
-    print('phase')
-    get_phase_data(data_path, total)
     plot_hist_phase()
+
+
+if __name__ == '__main__':
+    os.makedirs('plot', exist_ok=True)
+    setup_pyplot()
+
+    calc('./raw_data/individual')
+    plot()
@@ -0,0 +1,293 @@
+'''
+File: instrument.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import atexit
+import functools
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+
+# ANALYZE_TRACE=trace.json records the hot paths of a run and writes them there at exit in the Chrome trace event format
+# (chrome://tracing, https://ui.perfetto.dev), with a summary table on stderr.
+# ANALYZE_TRACE_MEMORY=1 adds the peak memory of each span (tracemalloc, slows down allocations)
+TRACE_ENV = 'ANALYZE_TRACE'
+MEMORY_ENV = 'ANALYZE_TRACE_MEMORY'
+OWNER_ENV = 'ANALYZE_TRACE_OWNER'
+
+_recorder = None
+
+
+class _NullSpan:
+    '''
+    shared by every span while tracing is off, so that a disabled span costs one call and a with block
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ('name', 'args', 'start', 'cpu', 'counts', 'base', 'peak')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.counts = {}
+
+    def __enter__(self):
+        _recorder.enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        _recorder.exit(self)
+        return False
+
+
+class Recorder:
+    '''
+    events of one process. worker processes (forked or spawned) append theirs to path.parts/<pid>.jsonl
+    each time their outermost span closes, since pools terminate them without running atexit;
+    the process that enabled tracing merges them on export
+    '''
+
+    def __init__(self, path, memory):
+        self.path = os.path.abspath(path)
+        self.parts = self.path + '.parts'
+        self.memory = memory
+        self.owner = int(os.environ.get(OWNER_ENV, os.getpid()))
+        self.reset()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.events = []
+        self.totals = {}
+        self.local = threading.local()
+
+    @property
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def enter(self, span):
+        stack = self.stack
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # the peak is reset for the new span, so the open ones take what they reached so far
+            for s in stack:
+                s.peak = max(s.peak, peak)
+            tracemalloc.reset_peak()
+            span.base = span.peak = current
+        stack.append(span)
+        span.cpu = time.process_time_ns()
+        span.start = time.perf_counter_ns()
+
+    def exit(self, span):
+        end = time.perf_counter_ns()
+        cpu = time.process_time_ns() - span.cpu
+        stack = self.stack
+        stack.pop()
+        args = dict(span.args)
+        args['cpu [ms]'] = cpu / 1e6
+        args.update(span.counts)
+        if self.memory:
+            span.peak = max(span.peak, tracemalloc.get_traced_memory()[1])
+            args['peak [MB]'] = (span.peak - span.base) / 1e6
+        self.events.append({'name': span.name, 'cat': 'analyze', 'ph': 'X', 'ts': span.start / 1e3, 'dur': (end - span.start) / 1e3,
+                            'pid': self.pid, 'tid': threading.get_ident(), 'args': args})
+        for name in span.counts:
+            self.events.append({'name': name, 'ph': 'C', 'ts': end / 1e3, 'pid': self.pid, 'args': {name: self.totals[name]}})
+        if not stack and self.pid != self.owner:
+            self.flush()
+
+    def count(self, counters):
+        for name, n in counters.items():
+            self.totals[name] = self.totals.get(name, 0) + n
+            for s in self.stack:
+                s.counts[name] = s.counts.get(name, 0) + n
+
+    def flush(self):
+        if not self.events:
+            return
+        os.makedirs(self.parts, exist_ok=True)
+        with open(os.path.join(self.parts, f'{self.pid}.jsonl'), 'a') as f:
+            f.writelines(json.dumps(e) + '\n' for e in self.events)
+        self.events = []
+
+    def collect(self):
+        '''
+        events of this process and of the workers flushed so far
+        '''
+        now = time.perf_counter_ns() / 1e3
+        events = list(self.events) + [{'name': name, 'ph': 'C', 'ts': now, 'pid': self.pid, 'args': {name: n}} for name, n in self.totals.items()]
+        if os.path.isdir(self.parts):
+            for name in sorted(os.listdir(self.parts)):
+                with open(os.path.join(self.parts, name)) as f:
+                    events.extend(json.loads(line) for line in f if line.strip())
+        return events
+
+
+def _after_fork():
+    if _recorder is not None:
+        _recorder.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def enable(path='trace.json', memory=False):
+    '''
+    starts tracing this process and the worker processes it starts; the trace is written to path at exit
+    '''
+    global _recorder
+    if _recorder is not None:
+        return
+    # spawned workers import this module again and find the trace through the environment
+    os.environ[TRACE_ENV] = path
+    os.environ[MEMORY_ENV] = '1' if memory else '0'
+    os.environ.setdefault(OWNER_ENV, str(os.getpid()))
+    _recorder = Recorder(path, memory)
+    if _recorder.owner == os.getpid():
+        shutil.rmtree(_recorder.parts, ignore_errors=True)
+        atexit.register(_export_at_exit)
+
+
+def enabled():
+    return _recorder is not None
+
+
+def span(name, **args):
+    '''
+    with span('parse'): ... records the wall and CPU time of the block; args are shown with the event
+    '''
+    if _recorder is None:
+        return NULL_SPAN
+    return Span(name, args)
+
+
+def timed(name=None):
+    '''
+    decorator recording every call of a function as a span (the function name by default)
+    '''
+    def wrap(f):
+        label = f.__name__ if name is None else name
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return f(*args, **kwargs)
+            with Span(label, {}):
+                return f(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+def count(**counters):
+    '''
+    adds to the counters of the run and of every open span, e.g. count(files=1, bytes=size, samples=n)
+    '''
+    if _recorder is None:
+        return
+    _recorder.count(counters)
+
+
+def summarize(events):
+    '''
+    per span name over all processes: calls, wall and CPU time [s], peak memory [MB] and counters,
+    plus the counter totals of the run
+    '''
+    stages = {}
+    last = {}
+    for e in events:
+        if e['ph'] == 'C':
+            key = (e['pid'], e['name'])
+            if key not in last or e['ts'] >= last[key][0]:
+                last[key] = (e['ts'], e['args'][e['name']])
+            continue
+        if e['ph'] != 'X':
+            continue
+        s = stages.setdefault(e['name'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak': None, 'counts': {}})
+        s['calls'] += 1
+        s['wall'] += e['dur'] / 1e6
+        s['cpu'] += e['args'].get('cpu [ms]', 0.0) / 1e3
+        if 'peak [MB]' in e['args']:
+            s['peak'] = max(s['peak'] or 0.0, e['args']['peak [MB]'])
+        for k in ['files', 'bytes', 'samples']:
+            if k in e['args']:
+                s['counts'][k] = s['counts'].get(k, 0) + e['args'][k]
+    totals = {}
+    for (_, name), (_, value) in last.items():
+        totals[name] = totals.get(name, 0) + value
+    return stages, totals
+
+
+def format_summary(stages, totals):
+    '''
+    spans with a CPU/wall ratio well below one spent their time waiting, on the disk or on worker processes
+    '''
+    lines = [f'{"span":<24}{"calls":>8}{"wall [s]":>11}{"cpu [s]":>10}{"cpu/wall":>10}{"peak [MB]":>11}'
+             f'{"files":>8}{"MB read":>10}{"MB/s":>9}{"Msamples":>10}']
+    for name, s in sorted(stages.items(), key=lambda kv: -kv[1]['wall']):
+        c = s['counts']
+        ratio = s['cpu'] / s['wall'] if s['wall'] > 0 else 0.0
+        peak = f'{s["peak"]:.1f}' if s['peak'] is not None else '-'
+        mb = f'{c["bytes"] / 1e6:.1f}' if 'bytes' in c else '-'
+        rate = f'{c["bytes"] / 1e6 / s["wall"]:.1f}' if 'bytes' in c and s['wall'] > 0 else '-'
+        samples = f'{c["samples"] / 1e6:.2f}' if 'samples' in c else '-'
+        lines.append(f'{name:<24}{s["calls"]:>8}{s["wall"]:>11.3f}{s["cpu"]:>10.3f}{ratio:>10.2f}{peak:>11}'
+                     f'{c.get("files", "-"):>8}{mb:>10}{rate:>9}{samples:>10}')
+    if totals:
+        lines.append('totals: ' + ', '.join(f'{k} {v}' for k, v in sorted(totals.items())))
+    lines.append('wall and cpu are summed over processes; cpu/wall near 1 is CPU-bound, near 0 waiting on I/O or workers')
+    return '\n'.join(lines)
+
+
+def export(path=None):
+    '''
+    writes the Chrome trace of this process and its workers to path and returns the summary table
+    '''
+    if _recorder is None:
+        return ''
+    path = _recorder.path if path is None else path
+    events = _recorder.collect()
+    meta = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'main' if pid == _recorder.owner else f'worker {pid}'}}
+            for pid in sorted({e['pid'] for e in events})]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': meta + events, 'displayTimeUnit': 'ms'}, f)
+    return format_summary(*summarize(events))
+
+
+def _export_at_exit():
+    if _recorder is None or os.getpid() != _recorder.owner:
+        return
+    summary = export()
+    shutil.rmtree(_recorder.parts, ignore_errors=True)
+    print(f'\ntrace written to {_recorder.path}\n{summary}', file=sys.stderr)
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV], os.environ.get(MEMORY_ENV, '0') != '0')
@@ -0,0 +1,141 @@
+'''
+File: loader.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import os
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from shared import get_40kHz_spectrum, print_progress
+from scan_index import get_index, sort_keys
+from csv_reader import read_picoscope
+from waveform_store import open_store
+from phasor_table import open_table
+from checkpoint import Checkpoint
+from instrument import span, timed
+
+
+def pool_size(processes=None):
+    '''
+    worker processes of a pool: processes if given, else ANALYZE_PROCESSES, else all cores (None).
+    build.py sets ANALYZE_PROCESSES in its workers so that stages running side by side share the cores
+    '''
+    if processes is not None:
+        return processes
+    value = os.environ.get('ANALYZE_PROCESSES')
+    return int(value) if value else None
+
+
+def read_cond(data_path):
+    return pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
+
+
+def read_waveform(filepath):
+    return read_picoscope(filepath, dtype=np.float64)
+
+
+@timed('extract')
+def extract(args):
+    filepath, dt = args
+    return get_40kHz_spectrum(read_waveform(filepath), dt)[0]
+
+
+def load_spectrum(filepaths, dt, processes=None, chunksize=8):
+    '''
+    complex 40 kHz component of each file, in the order of filepaths
+    '''
+    total = len(filepaths)
+    spectrum = np.empty(total, dtype=np.complex128)
+    tasks = [(filepath, dt) for filepath in filepaths]
+    processes = pool_size(processes)
+    with span('load_spectrum', files=total):
+        if processes == 1:
+            results = map(extract, tasks)
+            for c, s in enumerate(results):
+                spectrum[c] = s
+                print_progress(c + 1, total)
+        else:
+            with Pool(processes) as pool:
+                for c, s in enumerate(pool.imap(extract, tasks, chunksize)):
+                    spectrum[c] = s
+                    print_progress(c + 1, total)
+    print()
+    return spectrum
+
+
+def load_scan(data_path, kind, where=None, processes=None, settle=0.0):
+    '''
+    returns (cond, keys, spectrum): keys is a DataFrame of the parsed keys and relative path of each
+    waveform of the given kind, sorted by key, and spectrum is its complex 40 kHz component [mV].
+    the packed waveform store or the phasor table of a reduced scan is used when present, otherwise csv files are parsed on all cores.
+    where is an optional function of keys returning a boolean mask of the waveforms to load.
+    csv files already processed are taken from the checkpoint of data_path, and files modified within the
+    last settle seconds are left out since the measurement program may still be writing them.
+    '''
+    store = open_store(data_path)
+    if store is None:
+        store = open_table(data_path)
+    if store is not None:
+        index = store.select(kind=kind)
+        keys = sort_keys(index, kind)
+        if where is not None:
+            keys = keys[where(keys).to_numpy()]
+        index = index.loc[keys.index]
+        return store.cond, keys.reset_index(drop=True), store.spectrum(index)
+
+    cond = read_cond(data_path)
+    dt = 1.0 / cond.at[0, 1]
+    keys = get_index(data_path).query(kind)
+    if where is not None:
+        keys = keys[where(keys).to_numpy()]
+
+    checkpoint = Checkpoint.load(data_path)
+    ready, pending, sizes, mtimes = checkpoint.pending(keys['path'], settle)
+    if pending.any():
+        paths = keys['path'].to_numpy()[pending]
+        spectrum = load_spectrum([os.path.join(data_path, path) for path in paths], dt, 1 if len(paths) < 16 else processes)
+        checkpoint.update(paths, sizes[pending], mtimes[pending], spectrum)
+        try:
+            checkpoint.save()
+        except OSError:
+            pass  # the result is still returned, only resuming is lost
+    keys = keys[ready].reset_index(drop=True)
+    return cond, keys, checkpoint.spectrum(keys['path'])
+
+
+def load_waveforms(data_path, kind, where=None, processes=None):
+    '''
+    returns (cond, keys, samples) like load_scan, with samples the (N_points, N_samples) waveform matrix [mV]
+    '''
+    store = open_store(data_path)
+    if store is not None:
+        index = store.select(kind=kind)
+        keys = sort_keys(index, kind)
+        if where is not None:
+            keys = keys[where(keys).to_numpy()]
+        rows = keys.index.to_numpy()
+        samples = store.samples[rows] * store.scales[rows, np.newaxis]
+        return store.cond, keys.reset_index(drop=True), samples
+
+    cond = read_cond(data_path)
+    keys = get_index(data_path).query(kind)
+    if where is not None:
+        keys = keys[where(keys).to_numpy()].reset_index(drop=True)
+    filepaths = [os.path.join(data_path, path) for path in keys['path']]
+    total = len(filepaths)
+    with Pool(pool_size(processes)) as pool:
+        samples = []
+        for c, sig in enumerate(pool.imap(read_waveform, filepaths, 8)):
+            samples.append(sig)
+            print_progress(c + 1, total)
+    print()
+    return cond, keys, np.stack(samples)
@@ -0,0 +1,142 @@
+'''
+File: phasor_table.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import os
+import sys
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from shared import get_40kHz_spectrum, get_bin_index, print_progress
+from scan_index import get_index, index_files
+from csv_reader import read_picoscope
+from waveform_store import find_scan_dirs
+from instrument import timed
+
+TABLE_FILE = 'phasors.csv'
+HARMONICS = 3
+FREQUENCY = 40e3
+
+
+def table_columns(harmonics=HARMONICS):
+    return ['path'] + [f'h{k}_{part}' for k in range(1, harmonics + 1) for part in ['re', 'im']] + ['dc', 'noise']
+
+
+def reduce_waveforms(samples, dt, harmonics=HARMONICS):
+    '''
+    (N x (2 harmonics + 2)) rows of the table for an (N_points, N_samples) matrix [mV]: complex components at
+    40 kHz x k in the normalization of get_40kHz_spectrum, the mean, and the rms of what is left after removing both
+    '''
+    samples = np.atleast_2d(np.asarray(samples, dtype=np.float64))
+    N = samples.shape[-1]
+    dc = samples.mean(axis=1)
+    residual = samples - dc[:, np.newaxis]
+    components = []
+    for h in range(1, harmonics + 1):
+        c = get_40kHz_spectrum(samples, dt, freq=FREQUENCY * h)
+        components.append(c)
+        # the projection is onto the nearest DFT bin, so the tone is rebuilt at that bin
+        w = 2.0 * np.pi * get_bin_index(N, dt, FREQUENCY * h) * np.arange(N) / N
+        residual -= np.real(c[:, np.newaxis] * np.exp(1j * w))
+    noise = np.sqrt(np.mean(residual ** 2, axis=1))
+    parts = [p for c in components for p in [c.real, c.imag]]
+    return np.stack(parts + [dc, noise], axis=1)
+
+
+def write_table(data_path, paths, values, harmonics=HARMONICS):
+    table = pd.DataFrame(values, columns=table_columns(harmonics)[1:])
+    table.insert(0, 'path', list(paths))
+    table.to_csv(os.path.join(data_path, TABLE_FILE), index=False, float_format='%.6g')
+
+
+@timed('reduce')
+def reduce_file(args):
+    path, dt, harmonics = args
+    return reduce_waveforms(read_picoscope(path, dtype=np.float64), dt, harmonics)[0]
+
+
+def reduce_scan(data_path, harmonics=HARMONICS, keep_every=None, processes=None):
+    '''
+    reduce every waveform csv (or .bin) of a scan directory into phasors.csv on all cores.
+    with keep_every, only every keep_every-th raw file is kept and the others are removed
+    '''
+    index = get_index(data_path).files
+    if len(index) == 0:
+        raise ValueError(f'No waveform files found in {data_path}')
+    cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
+    dt = 1.0 / cond.at[0, 1]
+    values = np.empty((len(index), 2 * harmonics + 2))
+    tasks = [(os.path.join(data_path, path), dt, harmonics) for path in index['path']]
+    with Pool(processes) as pool:
+        for i, row in enumerate(pool.imap(reduce_file, tasks, 8)):
+            values[i] = row
+            print_progress(i + 1, len(index))
+    print()
+    write_table(data_path, index['path'], values, harmonics)
+    if keep_every is not None:
+        for i, path in enumerate(index['path']):
+            if i % keep_every != 0:
+                os.remove(os.path.join(data_path, path))
+
+
+def has_table(data_path):
+    return os.path.isfile(os.path.join(data_path, TABLE_FILE))
+
+
+class PhasorTable:
+    '''
+    reduced scan: one row of harmonic phasors, DC and noise floor per capture, keyed by the path the raw file has
+    (or would have), so that it is indexed like the raw scan
+    '''
+
+    def __init__(self, data_path):
+        self.path = data_path
+        self.cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
+        table = pd.read_csv(os.path.join(data_path, TABLE_FILE))
+        # rows of the table in the order of the index
+        self.index = index_files(table['path'])
+        self.table = table.set_index('path').loc[self.index['path']].reset_index()
+
+    @property
+    def harmonics(self):
+        return sum(1 for c in self.table.columns if c.endswith('_re'))
+
+    def __len__(self):
+        return len(self.index)
+
+    def spectrum(self, index=None, harmonic=1):
+        '''
+        complex component [mV] at 40 kHz x harmonic of the rows in index (all rows by default), in index order
+        '''
+        rows = self.table if index is None else self.table.loc[index.index]
+        return rows[f'h{harmonic}_re'].to_numpy() + 1j * rows[f'h{harmonic}_im'].to_numpy()
+
+    def select(self, kind=None, dev=None):
+        index = self.index
+        if kind is not None:
+            index = index[index['kind'] == kind]
+        if dev is not None:
+            index = index[index['dev'] == dev]
+        return index
+
+
+def open_table(data_path):
+    return PhasorTable(data_path) if has_table(data_path) else None
+
+
+if __name__ == '__main__':
+    # python phasor_table.py [root] [keep_every]
+    root = sys.argv[1] if len(sys.argv) > 1 else './raw_data'
+    keep_every = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    for data_path in find_scan_dirs(root):
+        print(data_path)
+        reduce_scan(data_path, keep_every=keep_every)
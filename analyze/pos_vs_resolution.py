@@ -4,34 +4,24 @@ Project: python
 Created Date: 04/06/2020
 Author: Shun Suzuki
 -----
-Last Modified: 22/02/2021
+Last Modified: 17/10/2026
 Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
 -----
 Copyright (c) 2020 Hapis Lab. All rights reserved.
 
 '''
 
-import math
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import os
 
-from afc.python.afc import UniformSystem
-from afc.python.afc import SphereWaveSource, T4010A1  # NOQA
-from afc.python.afc import CpuCalculator, GpuCalculator, GridAreaBuilder, PressureFieldBuffer, PowerFieldBuffer  # NOQA
-from afc.python.afc import Optimizer
-
+from field import Medium, transducer_grid, grid_points, phase_resolution_sweep
 from shared import setup_pyplot, print_progress
 
-RESOLUTION = 0.1
-
+DPI = 300
+ext = '.pdf'
 
-def to_digital(system, digit):
-    for source in system.get_wave_sources():
-        phase = source.phase / (2.0 * math.pi)
-        phase = (math.floor(phase * digit + 0.5) % digit) / digit
-        source.phase = 2.0 * math.pi * phase
+RESOLUTION = 0.1
 
 
 def calc():
@@ -40,7 +30,6 @@ def calc():
     TRANS_SIZE = 10.16
     FREQUENCY = 40e3
     TEMPERATURE = 287.6843037730883
-    Z_DIR = np.array([0., 0., 1.])  # sound source direction
     R = 8.5
     Z = 500.0
 
@@ -49,54 +38,28 @@ def calc():
     # Observe properties, units are mm
     X_RANGE = (array_center[0], array_center[0] + 2 * R)
 
-    # Initialize calculator
-    calculator = CpuCalculator()
-
-    # initialize position, direction, amplitude and phase of each sound source
-    system = UniformSystem(TEMPERATURE)
-    for y in range(NUM_TRANS_Y):
-        for x in range(NUM_TRANS_X):
-            pos = np.array([TRANS_SIZE * x, TRANS_SIZE * y, 0.])
-            source = T4010A1(pos, Z_DIR, 1.0, 0.0, FREQUENCY)
-            system.add_wave_source(source)
+    # initialize position, amplitude and phase of each sound source
+    medium = Medium(TEMPERATURE, FREQUENCY)
+    sources = transducer_grid(NUM_TRANS_X, NUM_TRANS_Y, TRANS_SIZE)
+    amps = np.ones(len(sources))
 
     # Generate observe area, units are mm
-    observe_area = GridAreaBuilder()\
-        .x_range(X_RANGE)\
-        .y_at(array_center[1])\
-        .z_at(Z)\
-        .resolution(RESOLUTION)\
-        .generate()
-    field = PressureFieldBuffer()
+    observe_area = grid_points(X_RANGE, (array_center[1], array_center[1]), (Z, Z), RESOLUTION)
 
     foci_x = np.array([x * RESOLUTION for x in range(85 + 1)])
-    phase_div = range(2, 256)
-    df = pd.DataFrame(columns=['x'].extend(phase_div))
-    df['x'] = foci_x
-    c = 0
-    total = len(foci_x) * len(phase_div)
-    for i in phase_div:
-        N = 85 + 1
-        results = np.zeros(N)
-        d = 0
-        for focus_x in foci_x:
-            focal_pos = array_center + np.array([focus_x, 0, 0])
-            Optimizer.focus(system, focal_pos)
-            to_digital(system, i)
-
-            result = calculator.calculate(system, observe_area, field)
-            max_index = np.argmax(result)
-            results[d] = max_index
-            d += 1
-            c += 1
-            print_progress(c, total)
-
-        df[i] = results
+    foci = array_center + np.outer(foci_x, [1., 0., 0.])
+    phase_div = np.arange(2, 256)
+    fields = phase_resolution_sweep(sources, amps, foci, observe_area, medium, phase_div, progress=print_progress)
+    print()
+
+    df = pd.DataFrame(np.argmax(fields, axis=2).astype(np.float64), columns=phase_div)
+    df.insert(0, 'x', foci_x)
 
     df.to_csv('pos_vs_argmax.csv')
 
 
 def plot():
+    import matplotlib.pyplot as plt
     df = pd.read_csv('pos_vs_argmax.csv')
     results = np.zeros(255)  # 2 - 256
     results_max = np.zeros(255)  # 2 - 256
@@ -114,8 +77,6 @@ def plot():
         results[i - 2] = diff_mean
         results_max[i - 2] = diff_max
 
-    setup_pyplot()
-    DPI = 300
     fig = plt.figure(figsize=(6, 6), dpi=DPI)
 
     axes = fig.add_subplot()
@@ -156,7 +117,5 @@ if __name__ == '__main__':
     os.makedirs('plot', exist_ok=True)
     setup_pyplot()
 
-    DPI = 300
-    ext = '.pdf'
     calc()
     plot()
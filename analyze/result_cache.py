@@ -0,0 +1,122 @@
+'''
+File: result_cache.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import hashlib
+import json
+import os
+import pickle
+from scan_index import get_index
+from checkpoint import code_version, stat_files
+
+CACHE_DIR = os.environ.get('ANALYZE_CACHE_DIR', os.path.join('.cache', 'results'))
+MAX_CACHE_BYTES = int(os.environ.get('ANALYZE_CACHE_MAX_BYTES', 1 << 30))
+ENABLED = os.environ.get('ANALYZE_CACHE', '1') != '0'
+
+# modules every calc stage depends on
+SHARED_SOURCES = ['shared.py', 'loader.py', 'scan_index.py', 'waveform_store.py', 'csv_reader.py', 'checkpoint.py', 'bin_reader.py', 'phasor_table.py']
+
+
+def input_fingerprint(data_path):
+    '''
+    cheap summary of a scan directory: size and mtime of every waveform file (a file rewritten in place leaves the
+    directory mtime unchanged), directory mtimes, cond.txt, the packed store and the phasor table
+    '''
+    h = hashlib.sha256()
+    index = get_index(data_path)
+    paths = index.files['path'].tolist()
+    sizes, mtimes = stat_files(data_path, paths)
+    h.update('\n'.join(f'{p}:{s}:{m}' for p, s, m in zip(paths, sizes.tolist(), mtimes.tolist())).encode())
+    h.update(json.dumps(sorted(index.dir_mtimes.items())).encode())
+    for name in ['cond.txt', 'waveforms.npy', 'waveforms_index.csv', 'phasors.csv']:
+        path = os.path.join(data_path, name)
+        if not os.path.isfile(path):
+            continue
+        st = os.stat(path)
+        h.update(f'{name}:{st.st_size}:{st.st_mtime_ns}'.encode())
+        if name == 'cond.txt':
+            with open(path, 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+def cache_key(name, data_paths, params, sources):
+    key = {
+        'name': name,
+        'inputs': [input_fingerprint(data_path) for data_path in data_paths],
+        'params': params,
+        'code': code_version(SHARED_SOURCES + list(sources)),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# size of the cache when this process last listed it, plus what it wrote since
+_cache_bytes = None
+
+
+def evict(max_bytes=MAX_CACHE_BYTES, added=0):
+    '''
+    remove least recently used entries until the cache fits in max_bytes.
+    the directory is only listed again when the known size exceeds max_bytes; other processes (build.py workers)
+    write and evict concurrently, so their temporary files are skipped and entries may vanish at any point
+    '''
+    global _cache_bytes
+    if _cache_bytes is not None:
+        _cache_bytes += added
+        if _cache_bytes <= max_bytes:
+            return
+    entries = []
+    for filename in os.listdir(CACHE_DIR):
+        if filename.endswith('.tmp'):
+            continue
+        try:
+            st = os.stat(os.path.join(CACHE_DIR, filename))
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime_ns, st.st_size, filename))
+    total = sum(e[1] for e in entries)
+    for _, size, filename in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(CACHE_DIR, filename))
+        except FileNotFoundError:
+            pass
+        total -= size
+    _cache_bytes = total
+
+
+def cached(name, data_paths, params, compute, sources=()):
+    '''
+    result of compute(), reused while the inputs, params and sources are unchanged
+    '''
+    if not ENABLED:
+        return compute()
+
+    key = cache_key(name, data_paths, params, sources)
+    path = os.path.join(CACHE_DIR, f'{name}-{key[:32]}.pkl')
+    try:
+        os.utime(path)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass  # not cached yet, or evicted by another process
+
+    result = compute()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    size = os.path.getsize(tmp_path)
+    os.replace(tmp_path, path)
+    evict(added=size)
+    return result
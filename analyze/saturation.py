@@ -4,7 +4,7 @@ Project: analyze
 Created Date: 19/02/2021
 Author: Shun Suzuki
 -----
-Last Modified: 26/02/2021
+Last Modified: 17/10/2026
 Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
 -----
 Copyright (c) 2021 Hapis Lab. All rights reserved.
@@ -13,52 +13,42 @@ Copyright (c) 2021 Hapis Lab. All rights reserved.
 
 
 import glob
+from functools import lru_cache
 import re
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from shared import setup_pyplot, get_40kHz_amp, print_progress
+from shared import setup_pyplot
+from loader import load_scan
+from result_cache import cached
 
+DPI = 300
+ext = '.pdf'
 
-def get_amp_data(data_path):
-    p = re.compile(r'duty(\d+).csv')
 
-    cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
-    sample_rate = cond.at[0, 1]
+def calc_amp_data(data_path, settle=0.0):
+    cond, keys, spectrum = load_scan(data_path, 'duty', settle=settle)
     mV_per_Pa = cond.at[2, 1]
-    dt = 1.0 / sample_rate
-
-    duties = []
-    total = 0
-    for filepath in glob.glob(os.path.join(data_path, '*')):
-        m = p.match(filepath.split(os.path.sep)[-1])
-        if m is None:
-            continue
-
-        duty = int(m.group(1))
-        duties.append(duty)
-        total += 1
 
-    duties = np.array(sorted(duties))
-    results_sound = pd.DataFrame(index=duties, columns=['rms'])
-    c = 0
-    for filepath in glob.glob(os.path.join(data_path, '*')):
-        m = p.match(filepath.split(os.path.sep)[-1])
-        if m is None:
-            continue
+    amps = np.abs(spectrum) / mV_per_Pa / np.sqrt(2)
+    return pd.DataFrame({'rms': amps}, index=keys['duty'].to_numpy())
 
-        df = pd.read_csv(filepath_or_buffer=filepath, sep=",")
-        sound = df['  A Max [mV]']
 
-        duty = int(m.group(1))
-        results_sound.at[duty, 'rms'] = get_40kHz_amp(sound, dt) / mV_per_Pa / np.sqrt(2)
-        c += 1
-        print_progress(c, total)
+@lru_cache(maxsize=None)
+def get_amp_data(data_path):
+    '''
+    memoized in the process as well, the plots of all z read the same folders
+    '''
+    return cached('saturation', [data_path], {'freq': 40e3}, lambda: calc_amp_data(data_path), [__file__])
 
-    print()
 
-    return results_sound
+def calc_partial(data_path, settle=1.0):
+    '''
+    writes saturation.csv from the duty ratios measured so far and returns their number
+    '''
+    results = calc_amp_data(data_path, settle)
+    results.to_csv('saturation.csv')
+    return len(results)
 
 
 def get_calib_ratio(data, data_covered):
@@ -75,7 +65,18 @@ def sin_fit(v, r, a):
     return res
 
 
+def calc(satiration_path):
+    '''
+    amplitude data of every saturation(_cover)_NxM_zZ folder, shared by the plots of all z
+    '''
+    p = re.compile(r'saturation(_cover)?_(\d)x(\d)_z(\d+)')
+    for folder_path in sorted(glob.glob(os.path.join(satiration_path, '*'))):
+        if p.match(os.path.basename(folder_path)) is not None:
+            get_amp_data(folder_path)
+
+
 def duty(satiration_path, plot_z):
+    import matplotlib.pyplot as plt
     fig = plt.figure(figsize=(8, 8), dpi=DPI)
     ax = fig.add_subplot(111)
 
@@ -139,8 +140,7 @@ if __name__ == '__main__':
     os.makedirs('plot', exist_ok=True)
     setup_pyplot()
 
-    DPI = 300
-    ext = '.pdf'
-    duty('./raw_data/saturation', 150, False)
-    duty('./raw_data/saturation', 300, False)
-    duty('./raw_data/saturation', 500, False)
+    calc('./raw_data/saturation')
+    duty('./raw_data/saturation', 150)
+    duty('./raw_data/saturation', 300)
+    duty('./raw_data/saturation', 500)
@@ -0,0 +1,185 @@
+'''
+File: scan_index.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import hashlib
+import os
+import re
+import numpy as np
+import pandas as pd
+
+INDEX_DIR = os.environ.get('ANALYZE_INDEX_DIR', os.path.join('.cache', 'index'))
+INDEX_VERSION = 2  # bumped when the indexing rules change, so that cached indexes are rebuilt
+
+# file name pattern and key columns of each kind of scan
+PATTERNS = {
+    'xyz': (re.compile(r'x([+-]?\d+\.?\d+?)y([+-]?\d+\.?\d+?)z([+-]?\d+\.?\d+?)\.(?:csv|bin)$'), ['x', 'y', 'z']),
+    'duty': (re.compile(r'duty(\d+)\.(?:csv|bin)$'), ['duty']),
+    'amp': (re.compile(r'amp(\d+)\.(?:csv|bin)$'), ['amp']),
+    'phase': (re.compile(r'phase(\d+)\.(?:csv|bin)$'), ['phase']),
+    'input': (re.compile(r'input(\d+)\.(?:csv|bin)$'), ['input']),
+}
+DEV_PATTERN = re.compile(r'dev(\d+)')
+
+
+def match_file(filename):
+    for kind, (p, columns) in PATTERNS.items():
+        m = p.match(filename)
+        if m is None:
+            continue
+        values = [float(v) for v in m.groups()] if kind == 'xyz' else [int(v) for v in m.groups()]
+        return kind, dict(zip(columns, values))
+    return None, None
+
+
+def parse_path(rel_path):
+    '''
+    kind, dev, tr and keys of a waveform file from its path relative to the scan directory, or None
+    '''
+    parts = rel_path.replace('\\', '/').split('/')
+    kind, keys = match_file(parts[-1])
+    if kind is None:
+        return None
+    m = DEV_PATTERN.match(parts[0]) if len(parts) > 1 else None
+    dev = int(m.group(1)) if m is not None else -1
+    tr = parts[1] if len(parts) > 2 else ''
+    return dict(path=rel_path, kind=kind, dev=dev, tr=tr, **keys)
+
+
+def index_files(rel_paths):
+    '''
+    one entry per waveform: when a point has both the csv and the compressed .bin (the compressor ran
+    while the csv was kept), the csv is indexed
+    '''
+    columns = ['path', 'kind', 'dev', 'tr'] + [c for _, (_, cs) in PATTERNS.items() for c in cs]
+    rows = [row for row in map(parse_path, rel_paths) if row is not None]
+    files = pd.DataFrame(rows, columns=columns)
+    stems = files['path'].str.replace(r'\.(?:csv|bin)$', '', regex=True)
+    is_bin = files['path'].str.endswith('.bin')
+    keep = ~(is_bin & stems.duplicated(keep=False))
+    return files[keep].sort_values('path').reset_index(drop=True)
+
+
+def sort_keys(files, kind):
+    '''
+    key columns of kind (as int except for coordinates) with path, dev and tr, sorted by key
+    '''
+    columns = PATTERNS[kind][1]
+    files = files[['path', 'dev', 'tr'] + columns]
+    if kind != 'xyz':
+        files = files.astype({c: int for c in columns})
+    return files.sort_values(columns + ['path'], kind='stable')
+
+
+class ScanIndex:
+    '''
+    parsed keys and relative path of every waveform file under a scan directory, built with a single walk.
+    for nested scans (individual/devN/trM/...), dev is the device number and tr the transducer folder name.
+    '''
+
+    def __init__(self, data_path, files, dir_mtimes):
+        self.path = data_path
+        self.files = files
+        self.dir_mtimes = dir_mtimes
+
+    @classmethod
+    def build(cls, data_path):
+        rel_paths = []
+        dir_mtimes = {}
+        for root, _, filenames in os.walk(data_path):
+            rel_root = os.path.relpath(root, data_path)
+            dir_mtimes[rel_root] = os.stat(root).st_mtime_ns
+            for filename in filenames:
+                rel_paths.append(filename if rel_root == os.curdir else os.path.join(rel_root, filename))
+        return cls(data_path, index_files(rel_paths), dir_mtimes)
+
+    @staticmethod
+    def file_path(data_path):
+        '''
+        the index is kept under INDEX_DIR, keyed by the data path, so the data directory (and its mtime) is never touched
+        '''
+        key = hashlib.sha256(os.path.abspath(data_path).encode()).hexdigest()[:32]
+        return os.path.join(INDEX_DIR, key + '.pkl')
+
+    @classmethod
+    def load(cls, data_path):
+        '''
+        cached index, or None if missing, built by other indexing rules or any directory changed since it was built
+        '''
+        cache_path = cls.file_path(data_path)
+        if not os.path.isfile(cache_path):
+            return None
+        cached = pd.read_pickle(cache_path)
+        if cached.get('version') != INDEX_VERSION:
+            return None
+        index = cls(data_path, cached['files'], cached['dir_mtimes'])
+        return None if index.stale() else index
+
+    def save(self):
+        cache_path = self.file_path(self.path)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(INDEX_DIR, exist_ok=True)
+            pd.to_pickle({'version': INDEX_VERSION, 'files': self.files, 'dir_mtimes': self.dir_mtimes}, tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # the index is rebuilt next time
+
+    def stale(self):
+        '''
+        True if any directory changed since the index was built, i.e. files were added or removed
+        '''
+        for rel_root, mtime in self.dir_mtimes.items():
+            root = os.path.join(self.path, rel_root)
+            if not os.path.isdir(root) or os.stat(root).st_mtime_ns != mtime:
+                return True
+        return False
+
+    def query(self, kind, dev=None):
+        '''
+        files of the given kind (and device), sorted by key
+        '''
+        files = self.files[self.files['kind'] == kind]
+        if dev is not None:
+            files = files[files['dev'] == dev]
+        return sort_keys(files, kind).reset_index(drop=True)
+
+    def axis(self, kind, column):
+        return np.array(sorted(set(self.query(kind)[column])))
+
+    def devices(self):
+        return sorted(d for d in set(self.files['dev']) if d >= 0)
+
+    def transducers(self):
+        nested = self.files[self.files['dev'] >= 0]
+        return nested[['dev', 'tr']].drop_duplicates().sort_values(['dev', 'tr']).reset_index(drop=True)
+
+
+_indices = {}
+
+
+def get_index(data_path, use_cache=True, refresh=False):
+    '''
+    scan index of data_path, built once per process and cached on disk under INDEX_DIR.
+    with refresh, the index is rebuilt if the directory changed (e.g. a scan still in progress)
+    '''
+    key = os.path.abspath(data_path)
+    if key in _indices and not (refresh and _indices[key].stale()):
+        return _indices[key]
+
+    index = ScanIndex.load(data_path) if use_cache else None
+    if index is None:
+        index = ScanIndex.build(data_path)
+        if use_cache:
+            index.save()
+    _indices[key] = index
+    return index
@@ -0,0 +1,235 @@
+'''
+File: scan_plan.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from field import AUTD_WIDTH, AUTD_HEIGHT, autd_transducers, grid_points
+
+PLAN_COLUMNS = ['index', 'x [mm]', 'y [mm]', 'z [mm]', 'settle [ms]']
+
+
+class MotionModel:
+    '''
+    time of a linear move of the robot: trapezoidal velocity profile plus a fixed command overhead,
+    followed by a settle time growing with the distance moved (vibration after short steps dies out sooner)
+    and a dwell for the capture itself.
+    the defaults are rough figures for the M-710iC driven through frrjif; calibrate them with a timed scan
+    '''
+
+    def __init__(self, speed=100.0, accel=500.0, overhead=0.25, settle_min=0.1, settle_per_mm=0.02, settle_max=0.5, dwell=0.1):
+        self.speed = speed  # mm/s
+        self.accel = accel  # mm/s^2
+        self.overhead = overhead  # s
+        self.settle_min = settle_min  # s
+        self.settle_per_mm = settle_per_mm  # s/mm
+        self.settle_max = settle_max  # s, the fixed Thread.Sleep(500) of the measurement programs
+        self.dwell = dwell  # s
+
+    def move_time(self, d):
+        d = np.asarray(d, dtype=float)
+        d_acc = self.speed ** 2 / self.accel  # distance to reach the speed and stop again
+        t = np.where(d < d_acc, 2 * np.sqrt(d / self.accel), d / self.speed + self.speed / self.accel)
+        return t + self.overhead
+
+    def settle(self, d):
+        return np.clip(self.settle_min + self.settle_per_mm * np.asarray(d, dtype=float), self.settle_min, self.settle_max)
+
+
+def step_lengths(points, start=None):
+    '''
+    distances of the moves visiting points in order, the first one from start (or zero)
+    '''
+    steps = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    first = 0.0 if start is None else np.linalg.norm(points[0] - np.asarray(start, dtype=float))
+    return np.concatenate([[first], steps])
+
+
+def cost(points, model, start=None, settle=None):
+    '''
+    estimated wall-clock breakdown [s] of a scan visiting points in order; settle [s] per point overrides the model
+    '''
+    d = step_lengths(points, start)
+    settle = model.settle(d) if settle is None else np.broadcast_to(settle, d.shape)
+    move = model.move_time(d).sum()
+    dwell = model.dwell * len(d)
+    return {'travel [mm]': d.sum(), 'move [s]': move, 'settle [s]': settle.sum(), 'dwell [s]': dwell, 'total [s]': move + settle.sum() + dwell}
+
+
+def raster_order(points, start=None):
+    return np.arange(len(points))
+
+
+def serpentine_order(points, start=None, decimals=3):
+    '''
+    boustrophedon: x alternates direction row by row, y alternates layer by layer.
+    rows are the distinct y (and layers the distinct z), so grids with missing points work as well
+    '''
+    x, y, z = np.round(points, decimals).T
+    zi = np.unique(z, return_inverse=True)[1].ravel()
+    yi = np.unique(y, return_inverse=True)[1].ravel()
+    yk = np.where(zi % 2 == 1, -yi, yi)
+    row = np.unique(np.stack([zi, yk], axis=1), axis=0, return_inverse=True)[1].ravel()
+    xk = np.where(row % 2 == 1, -x, x)
+    return np.lexsort((xk, yk, zi))
+
+
+def nearest_neighbor(points, start=None):
+    n = len(points)
+    origin = points[0] if start is None else np.asarray(start, dtype=float)
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=int)
+    current = np.argmin(np.linalg.norm(points - origin, axis=1))
+    for k in range(n):
+        order[k] = current
+        visited[current] = True
+        if k == n - 1:
+            break
+        d = np.linalg.norm(points - points[current], axis=1)
+        d[visited] = np.inf
+        current = np.argmin(d)
+    return order
+
+
+def two_opt(points, order, max_passes=20):
+    '''
+    improves an open path (the first point stays first) by reversing segments while that shortens it
+    '''
+    order = order.copy()
+    n = len(order)
+    p = points[order]
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = p[i - 1], p[i]
+            c = p[i + 1:]
+            ab = np.linalg.norm(b - a)
+            ac = np.linalg.norm(c - a, axis=1)
+            # reversing order[i:j+1] replaces the edges a-b and c-d by a-c and b-d; the last point has no d
+            cd = np.append(np.linalg.norm(np.diff(p[i + 1:], axis=0), axis=1), 0.0)
+            bd = np.append(np.linalg.norm(p[i + 2:] - b, axis=1), 0.0)
+            gain = ab + cd - ac - bd
+            j = np.argmax(gain)
+            if gain[j] > 1e-9:
+                j += i + 1
+                order[i:j + 1] = order[i:j + 1][::-1]
+                p[i:j + 1] = p[i:j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def tsp_order(points, start=None):
+    '''
+    nearest-neighbour tour refined by 2-opt, for point sets that are not full grids
+    '''
+    return two_opt(points, nearest_neighbor(points, start))
+
+
+ORDERS = {'raster': raster_order, 'serpentine': serpentine_order, 'tsp': tsp_order}
+
+
+def plan(points, order='serpentine', start=None, model=None, indices=None):
+    '''
+    plan table: index in the raster order of the measurement program, position and settle time before the capture
+    '''
+    model = MotionModel() if model is None else model
+    indices = np.arange(len(points)) if indices is None else np.asarray(indices)
+    o = ORDERS[order](points, start)
+    p = points[o]
+    settle = np.round(model.settle(step_lengths(p, start)) * 1000).astype(int)
+    return pd.DataFrame({'index': indices[o], 'x [mm]': p[:, 0], 'y [mm]': p[:, 1], 'z [mm]': p[:, 2], 'settle [ms]': settle})
+
+
+def write_plan(path, df):
+    df.to_csv(path, columns=PLAN_COLUMNS, index=False, float_format='%.3f')
+
+
+def read_plan(path):
+    return pd.read_csv(path)
+
+
+def plan_cost(df, model, start=None):
+    '''
+    cost of a plan file, with its own settle times
+    '''
+    return cost(df[['x [mm]', 'y [mm]', 'z [mm]']].to_numpy(), model, start, df['settle [ms]'].to_numpy() / 1000)
+
+
+def compare(points, model, start=None):
+    '''
+    cost of each ordering; "raster (fixed settle)" is the current raster scan with Thread.Sleep(500) at every point
+    '''
+    results = {'raster (fixed settle)': cost(points, model, start, model.settle_max)}
+    for name, f in ORDERS.items():
+        results[name] = cost(points[f(points, start)], model, start)
+    return results
+
+
+def print_costs(results):
+    print(f'{"order":<24}{"travel [mm]":>14}{"move [min]":>12}{"settle [min]":>14}{"dwell [min]":>13}{"total [min]":>13}')
+    for name, r in results.items():
+        print(f'{name:<24}{r["travel [mm]"]:>14.0f}{r["move [s]"] / 60:>12.1f}{r["settle [s]"] / 60:>14.1f}'
+              f'{r["dwell [s]"] / 60:>13.1f}{r["total [s]"] / 60:>13.1f}')
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='order the robot positions of a scan and estimate its duration')
+    sub = parser.add_subparsers(dest='scan', required=True)
+    # defaults of xy_field/Program.cs: 3x3 devices, 100 mm square around the focus at z = 500 mm, 1 mm step
+    xc, yc = AUTD_WIDTH * 3 / 2, AUTD_HEIGHT * 3 / 2
+    xy = sub.add_parser('xy', help='grid scan of xy_field')
+    xy.add_argument('--x', type=float, nargs=2, default=[xc - 50, xc + 50], metavar=('MIN', 'MAX'))
+    xy.add_argument('--y', type=float, nargs=2, default=[yc - 50, yc + 50], metavar=('MIN', 'MAX'))
+    xy.add_argument('--z', type=float, nargs=2, default=[500, 500], metavar=('MIN', 'MAX'))
+    xy.add_argument('--resolution', type=float, default=1.0)
+    xy.add_argument('--start', type=float, nargs=3, default=[xc, yc, 500], help='robot position before the scan')
+    individual = sub.add_parser('individual', help='one point above each transducer, trans_individual_diff')
+    individual.add_argument('--devices', type=int, nargs=2, default=[3, 3], metavar=('NX', 'NY'))
+    individual.add_argument('--z', type=float, default=200)
+    individual.add_argument('--start', type=float, nargs=3, default=None)
+    for p in [xy, individual]:
+        p.add_argument('--order', choices=list(ORDERS), default=None, help='serpentine for xy, tsp for individual by default')
+        p.add_argument('--out', default=None, help='plan file for the measurement program')
+        p.add_argument('--speed', type=float, default=100.0, help='mm/s')
+        p.add_argument('--accel', type=float, default=500.0, help='mm/s^2')
+        p.add_argument('--overhead', type=float, default=0.25, help='s per move')
+        p.add_argument('--settle-min', type=float, default=0.1, help='s')
+        p.add_argument('--settle-per-mm', type=float, default=0.02, help='s/mm')
+        p.add_argument('--settle-max', type=float, default=0.5, help='s')
+        p.add_argument('--dwell', type=float, default=0.1, help='s per capture')
+    args = parser.parse_args(argv)
+
+    model = MotionModel(args.speed, args.accel, args.overhead, args.settle_min, args.settle_per_mm, args.settle_max, args.dwell)
+    if args.scan == 'xy':
+        points = grid_points(args.x, args.y, args.z, args.resolution)
+        order = args.order or 'serpentine'
+        start = args.start
+    else:
+        points = autd_transducers(*args.devices) + [0, 0, args.z]
+        order = args.order or 'tsp'
+        start = args.start if args.start is not None else [0, 0, args.z]
+
+    print(f'{len(points)} points')
+    print_costs(compare(points, model, start))
+    if args.out is not None:
+        df = plan(points, order, start, model)
+        write_plan(args.out, df)
+        print(f'{order} plan written to {args.out}: {plan_cost(df, model, start)["total [s]"] / 60:.1f} min')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
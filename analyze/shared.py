@@ -4,19 +4,29 @@ Project: analyze
 Created Date: 16/02/2021
 Author: Shun Suzuki
 -----
-Last Modified: 20/02/2021
+Last Modified: 17/10/2026
 Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
 -----
 Copyright (c) 2021 Hapis Lab. All rights reserved.
 
 '''
 
-import matplotlib.pyplot as plt
+from functools import lru_cache
+import os
 import numpy as np
+from instrument import span
 
+FAST_RENDER = os.environ.get('ANALYZE_FAST_RENDER', '0') != '0'
 
-def setup_pyplot():
-    plt.rcParams['text.usetex'] = True
+
+def setup_pyplot(fast=None):
+    '''
+    figure style of the paper; fast (or ANALYZE_FAST_RENDER=1) skips LaTeX and AFM fonts for quick drafts
+    '''
+    import matplotlib.pyplot as plt
+    if fast is None:
+        fast = FAST_RENDER
+    plt.rcParams['text.usetex'] = not fast
     plt.rcParams['axes.grid'] = False
     plt.rcParams['xtick.direction'] = 'in'
     plt.rcParams['ytick.direction'] = 'in'
@@ -26,6 +36,8 @@ def setup_pyplot():
     plt.rcParams['font.family'] = 'sans-serif'
     plt.rcParams['font.sans-serif'] = 'Arial'
     plt.rcParams["mathtext.fontset"] = 'stixsans'
+    if fast:
+        return
     plt.rcParams['ps.useafm'] = True
     plt.rcParams['pdf.use14corefonts'] = True
     plt.rcParams['text.latex.preamble'] = r'\usepackage{sfmath}'
@@ -36,22 +48,107 @@ def find_nearest(array, value):
     return (np.abs(array - value)).argmin()
 
 
+@lru_cache(maxsize=None)
+def get_bin_index(N, dt, freq=40e3):
+    return find_nearest(np.fft.rfftfreq(N, dt), freq)
+
+
+@lru_cache(maxsize=None)
+def get_dft_kernel(N, k):
+    w = 2.0 * np.pi * k * np.arange(N) / N
+    return np.cos(w), -np.sin(w)
+
+
+def get_40kHz_spectrum(samples, dt, method='dft', chunk=1024, freq=40e3):
+    '''
+    complex 40 kHz component of each row of an (N_points, N_samples) matrix
+    method='dft' projects each row onto the single bin (O(N) per row), 'fft' takes the full rfft
+    '''
+    samples = np.atleast_2d(samples)
+    N = samples.shape[-1]
+    k = get_bin_index(N, dt, freq)
+
+    spectrum = np.empty(samples.shape[0], dtype=np.complex128)
+    with span(method, samples=samples.size):
+        if method == 'dft':
+            cos, sin = get_dft_kernel(N, k)
+        for s in range(0, samples.shape[0], chunk):
+            block = np.asarray(samples[s:s + chunk], dtype=np.float64)
+            if method == 'dft':
+                spectrum[s:s + chunk] = (block @ cos) + 1j * (block @ sin)
+            elif method == 'fft':
+                spectrum[s:s + chunk] = np.fft.rfft(block, axis=-1)[:, k]
+            else:
+                raise ValueError(f'Unknown method: {method}')
+    return spectrum / (N / 2)
+
+
+def get_40kHz_amp_phase(samples, dt, method='dft', chunk=1024):
+    spectrum = get_40kHz_spectrum(samples, dt, method, chunk)
+    return np.abs(spectrum), np.angle(spectrum)
+
+
 def get_40kHz_amp(array, dt):
-    N = len(array)
-    spectrum = np.fft.rfft(array) / (N / 2)
-    magnitude = np.abs(spectrum)
-    f = np.fft.rfftfreq(N, dt)
-    idx = find_nearest(f, 40e3)
-    return magnitude[idx]
+    return np.abs(get_40kHz_spectrum(np.asarray(array), dt, method='fft')[0])
 
 
 def get_40kHz_phase(array, dt):
-    N = len(array)
-    spectrum = np.fft.rfft(array) / (N / 2)
-    phases = np.angle(spectrum)
-    f = np.fft.rfftfreq(N, dt)
-    idx = find_nearest(f, 40e3)
-    return phases[idx]
+    return np.angle(get_40kHz_spectrum(np.asarray(array), dt, method='fft')[0])
+
+
+def parabolic_peak(y, k):
+    '''
+    sub-sample offset of the peak of each row of y around index k
+    '''
+    rows = np.arange(y.shape[0])
+    k = np.clip(k, 1, y.shape[1] - 2)
+    y0 = y[rows, k - 1]
+    y1 = y[rows, k]
+    y2 = y[rows, k + 1]
+    denom = y0 - 2.0 * y1 + y2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.where(denom != 0, 0.5 * (y0 - y2) / denom, 0.0)
+    return k + delta
+
+
+def fft_size(n):
+    return 1 << int(np.ceil(np.log2(2 * n - 1)))
+
+
+def reference_spectrum(ref, nfft):
+    ref = np.asarray(ref, dtype=np.float64)
+    return np.conj(np.fft.rfft(ref - ref.mean(), nfft))
+
+
+def xcorr_delays(ref, sigs, dt, max_lag=None, ref_spectrum=None, unbiased=False):
+    '''
+    delay [s] of each row of sigs relative to ref, positive when the row lags ref.
+    the cross-correlation is computed for all rows at once via FFT and its peak is refined by parabolic interpolation.
+    max_lag [s] limits the search, e.g. to half a period for periodic signals.
+    unbiased divides each lag by the number of overlapping samples; without it the zero-padded correlation
+    pulls the peak toward zero lag when the windows are only a few periods long
+    '''
+    sigs = np.atleast_2d(np.asarray(sigs, dtype=np.float64))
+    N = sigs.shape[1]
+    nfft = fft_size(N)
+    if ref_spectrum is None:
+        ref_spectrum = reference_spectrum(ref, nfft)
+
+    sigs = sigs - sigs.mean(axis=1, keepdims=True)
+    corr = np.fft.irfft(np.fft.rfft(sigs, nfft) * ref_spectrum, nfft)
+    corr = np.concatenate([corr[:, nfft - (N - 1):], corr[:, :N]], axis=1)  # lags -(N-1) ... N-1
+    if unbiased:
+        corr /= N - np.abs(np.arange(-(N - 1), N))
+
+    if max_lag is not None:
+        lag = min(int(np.floor(max_lag / dt)), N - 1)
+        corr = corr[:, N - 1 - lag:N + lag]
+        offset = lag
+    else:
+        offset = N - 1
+
+    k = np.argmax(corr, axis=1)
+    return (parabolic_peak(corr, k) - offset) * dt
 
 
 def print_progress(i, total, width=32):
@@ -66,28 +163,51 @@ C = [0, 0, 0, -0.000787968093807, -0.000307591508224, -0.000218348633296, 0.0004
 D = [0, 0, 0, 1.60125528528e-05, 2.9747624976e-06, 2.31910931569e-05, -1.1901034125e-05, 6.77743734332e-06, -5.99548024824e-06, -4.79372835035e-06]
 
 
+A_TABLE = np.array(A)
+B_TABLE = np.array(B)
+C_TABLE = np.array(C)
+D_TABLE = np.array(D)
+
+
+def fold_angle(theta):
+    """
+    |theta| [rad] folded into [0, 90] deg
+    """
+    theta = np.mod(np.abs(np.asarray(theta, dtype=np.float64)) * 180.0 / np.pi, 180.0)
+    return np.where(theta > 90.0, 180.0 - theta, theta)
+
+
 def directivity(theta):
     """
-    third degree spline interpolation
+    third degree spline interpolation, element-wise over arrays
     """
 
-    theta = theta * 180.0 / np.pi
-    theta = abs(theta)
-    while theta > 90.0:
-        theta = abs(180.0 - theta)
+    theta = fold_angle(theta)
+
+    i = np.ceil(theta / 10.0).astype(np.int64)
+    x = theta - (i - 1) * 10.0
+    d = A_TABLE[i] + B_TABLE[i] * x + C_TABLE[i] * x**2 + D_TABLE[i] * x**3
+    d = np.where(i == 0, 1.0, d)
 
-    i = int(np.ceil(theta / 10.0))
+    return d if d.ndim > 0 else float(d)
 
-    d = 1.0
-    if i != 0:
-        a = A[i]
-        b = B[i]
-        c = C[i]
-        d = D[i]
-        x = theta - (i - 1) * 10.0
-        d = a + b * x + c * x**2 + d * x**3
 
-    return d
+@lru_cache(maxsize=None)
+def directivity_table(n=9001):
+    deg = np.linspace(0.0, 90.0, n)
+    table = directivity(deg * np.pi / 180.0)
+    return table, np.append(np.diff(table), 0.0)
+
+
+def directivity_lut(theta, n=9001):
+    """
+    directivity linearly interpolated from a dense table of n points over [0, 90] deg
+    """
+    table, slope = directivity_table(n)
+    t = fold_angle(theta) * ((n - 1) / 90.0)
+    i = t.astype(np.intp)
+    d = table[i] + slope[i] * (t - i)
+    return d if d.ndim > 0 else float(d)
 
 
 def attenuation_coef(freq, hr, ps, ps0, t):
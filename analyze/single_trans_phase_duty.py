@@ -4,7 +4,7 @@ Project: analyze
 Created Date: 16/02/2021
 Author: Shun Suzuki
 -----
-Last Modified: 22/02/2021
+Last Modified: 17/10/2026
 Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
 -----
 Copyright (c) 2021 Hapis Lab. All rights reserved.
@@ -12,15 +12,16 @@ Copyright (c) 2021 Hapis Lab. All rights reserved.
 '''
 
 
-import glob
 import math
-import re
 import os
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
-from shared import setup_pyplot, get_40kHz_amp, print_progress
+from shared import setup_pyplot, print_progress, xcorr_delays, reference_spectrum, fft_size
+from loader import load_scan, load_waveforms, read_cond
+from result_cache import cached
+from instrument import span, timed
+
+DPI = 300
+ext = '.pdf'
 
 
 def sin_fit(v, a):
@@ -34,69 +35,41 @@ def normalized(array):
     return (array - min_v) / (max_v - min_v)
 
 
-def get_amp_data(data_path):
-    p = re.compile(r'amp(\d+).csv')
-
-    cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
-    sample_rate = cond.at[0, 1]
-    mV_per_Pa = cond.at[2, 1]
-    dt = 1.0 / sample_rate
+def calc_amp(data_path, kind):
+    _, keys, spectrum = load_scan(data_path, kind)
 
-    results_sound = np.zeros(256)
-    c = 0
-    for filepath in glob.glob(os.path.join(data_path, '*')):
-        m = p.match(filepath.split(os.path.sep)[-1])
-        if m is None:
-            continue
+    results = np.zeros(256)
+    results[keys[kind].to_numpy()] = np.abs(spectrum)
+    return results
 
-        df = pd.read_csv(filepath_or_buffer=filepath, sep=",")
-        sound = df['  A Max [mV]']
 
-        duty = int(m.group(1))
-        results_sound[duty] = get_40kHz_amp(sound, dt) / mV_per_Pa / np.sqrt(2)
-        c += 1
-        print_progress(c, 256)
+def get_amp_data(data_path):
+    cond = read_cond(data_path)
+    mV_per_Pa = cond.at[2, 1]
 
-    print()
+    results_sound = cached('single_amp', [data_path], {'freq': 40e3}, lambda: calc_amp(data_path, 'amp'), [__file__])
+    results_sound = results_sound / mV_per_Pa / np.sqrt(2)
     print(f'max [Pa]: {results_sound.max()}')
 
     return normalized(results_sound)
 
 
 def get_input_data(data_path):
-    p = re.compile(r'input(\d+).csv')
-
-    cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
-    sample_rate = cond.at[0, 1]
-    dt = 1.0 / sample_rate
-
-    results_input = np.zeros(256)
-    c = 0
-    for filepath in glob.glob(os.path.join(data_path, '*')):
-        m = p.match(filepath.split(os.path.sep)[-1])
-        if m is None:
-            continue
-
-        df = pd.read_csv(filepath_or_buffer=filepath, sep=",")
-        input_sig = df['  A Max [mV]']
-
-        duty = int(m.group(1))
-        results_input[duty] = get_40kHz_amp(input_sig, dt)
-        c += 1
-        print_progress(c, 256)
-
-    print()
+    results_input = cached('single_input', [data_path], {'freq': 40e3}, lambda: calc_amp(data_path, 'input'), [__file__])
 
     return normalized(results_input)
 
 
 def duty(amp_path, input_path):
+    import matplotlib.pyplot as plt
+    from scipy.optimize import curve_fit
     sound_data = get_amp_data(amp_path)
     input_data = get_input_data(input_path)
 
     x = np.linspace(0, 255, 256)
 
-    param, cov = curve_fit(sin_fit, (x / (2 * 255.0) * math.pi), sound_data, p0=[0.75], maxfev=2000)
+    with span('fit'):
+        param, cov = curve_fit(sin_fit, (x / (2 * 255.0) * math.pi), sound_data, p0=[0.75], maxfev=2000)
     poten = param[0]
     print('alpha = ', poten)
 
@@ -128,41 +101,46 @@ def duty(amp_path, input_path):
     plt.savefig(os.path.join('plot', 'measured_amp_input' + ext), bbox_inches='tight', pad_inches=0)
 
 
-def phase(data_path):
-    p = re.compile(r'phase(\d+).csv')
+@timed('xcorr')
+def phase_delays(sig_base, samples, dt, period, chunk=64):
+    '''
+    phase delay [rad] in [0, 2pi) of each row of samples relative to sig_base, by FFT cross-correlation
+    '''
+    ref_spectrum = reference_spectrum(sig_base, fft_size(samples.shape[1]))
+    delays = np.empty(len(samples))
+    for s in range(0, len(samples), chunk):
+        delays[s:s + chunk] = xcorr_delays(sig_base, samples[s:s + chunk], dt, ref_spectrum=ref_spectrum)
+        print_progress(min(s + chunk, len(samples)), len(samples))
+    print()
+    return np.mod(delays / period * 2 * math.pi, 2 * math.pi)
 
-    cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
+
+def calc_phase_delay(data_path):
+    cond, keys, samples = load_waveforms(data_path, 'phase')
     sample_rate = cond.at[0, 1]
     dt = 1.0 / sample_rate
     period = 25e-6
 
-    df = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'phase0.csv'), sep=",")
-    sig_base = df['  A Max [mV]']
-    sig_base = sig_base - sig_base.mean()
-
+    sig_base = samples[(keys['phase'] == 0).to_numpy()][0]
     results = np.zeros(256)
-    c = 0
-    for filepath in glob.glob(os.path.join(data_path, '*')):
-        m = p.match(filepath.split(os.path.sep)[-1])
-        if m is None:
-            continue
-
-        df = pd.read_csv(filepath_or_buffer=filepath, sep=",")
-        sig = df['  A Max [mV]']
-        sig = sig - sig.mean()
-
-        corr = np.correlate(sig, sig_base, "full")
-        delay = corr.argmax() - (len(sig) - 1)
-        phases_delay = delay * dt / period * 2 * math.pi
-        if phases_delay < 0:
-            phases_delay += 2 * math.pi
-        phases_delay %= 2 * math.pi
-
-        phase_value = int(m.group(1))
-        results[phase_value] = phases_delay
-        c += 1
-        print_progress(c, 256)
-    print()
+    results[keys['phase'].to_numpy()] = phase_delays(sig_base, samples, dt, period)
+
+    return results
+
+
+def get_phase_data(data_path):
+    return cached('single_phase', [data_path], {'period': 25e-6}, lambda: calc_phase_delay(data_path), [__file__])
+
+
+def calc(amp_path, input_path, phase_path):
+    get_amp_data(amp_path)
+    get_input_data(input_path)
+    get_phase_data(phase_path)
+
+
+def phase(data_path):
+    import matplotlib.pyplot as plt
+    results = get_phase_data(data_path)
 
     x = np.linspace(0, 255, 256)
     fig = plt.figure(figsize=(6, 6), dpi=DPI)
@@ -192,7 +170,5 @@ if __name__ == '__main__':
     os.makedirs('plot', exist_ok=True)
     setup_pyplot()
 
-    DPI = 300
-    ext = '.pdf'
     duty('./raw_data/single_amp', './raw_data/single_input')
     phase('./raw_data/single_phase')
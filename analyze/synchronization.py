@@ -0,0 +1,121 @@
+'''
+File: synchronization.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import glob
+import os
+import re
+import numpy as np
+import pandas as pd
+from csv_reader import read_tektronix, read_tektronix_header, iter_tektronix
+from shared import xcorr_delays
+
+DATA_PATH = '../data/synchronization'
+PERIOD = 25e-6
+MIN_WINDOWS = 4  # fewer windows give no meaningful spread, only the mean skew is reported
+
+
+def find_channels(exp_path):
+    '''
+    {'CH1': path, ...} of the Tektronix channel csv files of an experiment
+    '''
+    p = re.compile(r'F\d+(CH\d).CSV', re.IGNORECASE)
+    channels = {}
+    for filepath in sorted(glob.glob(os.path.join(exp_path, '*'))):
+        m = p.match(os.path.basename(filepath))
+        if m is not None:
+            channels[m.group(1).upper()] = filepath
+    return channels
+
+
+def load_experiment(exp_path):
+    '''
+    returns (dt, channel names, samples (C x N)) of all channels of an experiment
+    '''
+    channels = find_channels(exp_path)
+    header = None
+    samples = []
+    for path in channels.values():
+        header, _, v = read_tektronix(path)
+        samples.append(v)
+    return header['Sample Interval'], list(channels.keys()), np.stack(samples)
+
+
+def load_all(data_path=DATA_PATH):
+    return {os.path.basename(exp_path): load_experiment(exp_path)
+            for exp_path in sorted(glob.glob(os.path.join(data_path, '*'))) if os.path.isdir(exp_path)}
+
+
+def stream_delays(channels, ref='CH2', window=None, chunk_periods=4):
+    '''
+    delays [s] (W x C) of every channel relative to ref for each window of a capture, reading the csv files
+    window samples at a time (four periods by default) so long drift captures are never fully loaded.
+    the correlation is normalized by the overlap of each lag, which would otherwise bias short windows toward zero delay
+    '''
+    names = list(channels.keys())
+    header = read_tektronix_header(channels[ref])
+    dt = header['Sample Interval']
+    if window is None:
+        window = int(round(chunk_periods * PERIOD / dt))
+    window = min(window, int(header['Record Length']))
+    max_lag = PERIOD / 2 if window * dt >= PERIOD else None
+
+    streams = [iter_tektronix(channels[name], chunk=window) for name in names]
+    ref_idx = names.index(ref)
+    delays = []
+    for chunks in zip(*streams):
+        v = np.stack([c[1] for c in chunks])
+        if v.shape[1] < window:
+            break  # drop the incomplete tail
+        delays.append(xcorr_delays(v[ref_idx], v, dt, max_lag, unbiased=True))
+    return names, np.array(delays)
+
+
+def jitter_stats(names, delays):
+    '''
+    skew [ns] statistics over windows for each channel; the spread is NaN with fewer than MIN_WINDOWS windows
+    '''
+    d = np.asarray(delays, dtype=float).reshape(-1, len(names)) * 1e9
+    spread = len(d) >= MIN_WINDOWS
+    nan = np.full(len(names), np.nan)
+    return pd.DataFrame({
+        'mean [ns]': d.mean(axis=0) if len(d) > 0 else nan,
+        'std [ns]': d.std(axis=0) if spread else nan,
+        'min [ns]': d.min(axis=0) if spread else nan,
+        'max [ns]': d.max(axis=0) if spread else nan,
+        'p-p [ns]': d.max(axis=0) - d.min(axis=0) if spread else nan,
+        'windows': len(d),
+    }, index=names)
+
+
+def analyze(data_path=DATA_PATH, ref='CH2'):
+    results = []
+    for exp_path in sorted(glob.glob(os.path.join(data_path, '*'))):
+        if not os.path.isdir(exp_path):
+            continue
+        channels = find_channels(exp_path)
+        if ref not in channels:
+            continue
+        names, delays = stream_delays(channels, ref)
+        stats = jitter_stats(names, delays)
+        stats.insert(0, 'experiment', os.path.basename(exp_path))
+        print(os.path.basename(exp_path))
+        print(stats.drop(columns='experiment'))
+        results.append(stats)
+
+    results = pd.concat(results)
+    results.to_csv('synchronization.csv')
+    return results
+
+
+if __name__ == '__main__':
+    analyze()
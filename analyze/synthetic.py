@@ -0,0 +1,255 @@
+'''
+File: synthetic.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import argparse
+import os
+import sys
+from multiprocessing import Pool
+import numpy as np
+from shared import print_progress
+from csv_reader import format_picoscope
+from bin_reader import write_bin
+from field import Medium, autd_transducers, calc_pressure, focus_phases, grid_points, AUTD_WIDTH, AUTD_HEIGHT, Z_DIR
+
+FREQUENCY = 40e3
+SOURCE_AMP = 23.77 * np.sqrt(2) * 300  # peak pressure [Pa] x distance [mm] of T4010A1 (121.5 dB SPL at 300 mm)
+ALPHA = 0.803  # amplitude ~ sin(pi D / 510)^alpha
+INPUT_AMP = 2400  # mV, 24 V drive through a 10:1 probe
+EXPERIMENTS = ['xy', 'saturation', 'individual', 'single']  # single: single_amp, single_input and single_phase
+
+
+def duty_amp(duty, alpha=ALPHA):
+    return np.sin(np.pi * np.asarray(duty) / 510.0) ** alpha
+
+
+def write_cond(data_path, sample_rate, sample_len, amplifier, temp, humidity, pos):
+    '''
+    cond.txt in the format of Conditions.Save
+    '''
+    c = np.sqrt(1.403 * 8.314462 * (273.15 + temp) / 28.966e-3)
+    with open(os.path.join(data_path, 'cond.txt'), 'w', encoding='utf-8') as f:
+        f.write(f'Sample Rate [Hz], {sample_rate}\n')
+        f.write(f'Sample Length, {sample_len}\n')
+        f.write(f'Amplifier [mV/Pa], {amplifier:g}\n')
+        f.write(f'Temp. [℃], {temp:g}\n')
+        f.write(f'Humidity [%], {humidity:g}\n')
+        f.write(f'Wavelength [mm], {c / 40:.7g}\n')
+        f.write(f'X [mm], {pos[0]:g}\n')
+        f.write(f'Y [mm], {pos[1]:g}\n')
+        f.write(f'Z [mm], {pos[2]:g}\n')
+
+
+def tone(n, dt, amp, phase, noise, rng, freq=FREQUENCY):
+    '''
+    amp cos(2 pi f t + phase) [mV] with white noise of standard deviation noise [mV]
+    '''
+    t = np.arange(n) * dt
+    return amp * np.cos(2 * np.pi * freq * t + phase) + rng.normal(0, noise, n)
+
+
+def pwm(n, dt, duty, amp, noise, rng, freq=FREQUENCY):
+    '''
+    AUTD3 drive signal of duty D (pulse width D / 510 of the period); its 40 kHz component is ~ sin(pi D / 510)
+    '''
+    t = np.arange(n) * dt
+    width = duty / 510.0
+    return amp * (np.mod(t * freq + width / 2, 1.0) < width) + rng.normal(0, noise, n)
+
+
+def synthetic_waveforms(n, n_samples, dt, seed=0, noise=2.0):
+    '''
+    (n x n_samples) 40 kHz captures [mV] with random amplitude and phase
+    '''
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples) * dt
+    amp = rng.uniform(50, 500, (n, 1))
+    phase = rng.uniform(0, 2 * np.pi, (n, 1))
+    return amp * np.cos(2 * np.pi * FREQUENCY * t + phase) + rng.normal(0, noise, (n, n_samples))
+
+
+def write_job(job):
+    '''
+    job = (path without extension, 'tone' or 'pwm', amplitude [mV] or duty, phase, samples, dt, noise, clip, seed, compress)
+    '''
+    path, kind, value, phase, n, dt, noise, clip, seed, compress = job
+    rng = np.random.default_rng(seed)
+    if kind == 'pwm':
+        sig = pwm(n, dt, value, INPUT_AMP, noise, rng)
+    else:
+        sig = tone(n, dt, value, phase, noise, rng)
+    if clip is not None:
+        sig = np.clip(sig, -clip, clip)  # range of the PicoScope channel
+    text = format_picoscope(sig, dt)
+    if compress:
+        write_bin(path + '.bin', text)
+    else:
+        with open(path + '.csv', 'w') as f:
+            f.write(text)
+
+
+class Generator:
+    '''
+    writes scans in the raw_data layout (file names and cond.txt of the measurement programs) with
+    physically plausible 40 kHz waveforms; sizes are configurable so that ingestion can be stress-tested
+    '''
+
+    def __init__(self, root, noise=2.0, alpha=ALPHA, samples=None, compress=False, seed=0):
+        self.root = root
+        self.noise = noise
+        self.alpha = alpha
+        self.samples = samples
+        self.compress = compress
+        self.seed = seed
+        self.jobs = []
+
+    def scan_dir(self, *names):
+        data_path = os.path.join(self.root, *names)
+        os.makedirs(data_path, exist_ok=True)
+        return data_path
+
+    def length(self, n):
+        '''
+        sample length of the captures of a scan: n of the measurement program unless overridden by samples
+        '''
+        return n if self.samples is None else self.samples
+
+    def add(self, path, kind, value, phase, n, dt, clip=None):
+        self.jobs.append((path, kind, value, phase, n, dt, self.noise, clip, self.seed + len(self.jobs), self.compress))
+
+    def xy(self, points=10201, num_autd=(3, 3), z=500.0, r=100.0, duty=10):
+        '''
+        focus of num_autd devices at z scanned on a square of side r, with about points points (101 x 101 by default)
+        '''
+        side = max(2, int(np.round(np.sqrt(points))))
+        resolution = r / (side - 1)
+        xc = AUTD_WIDTH * num_autd[0] / 2
+        yc = AUTD_HEIGHT * num_autd[1] / 2
+        temp, amplifier = 22.7, 1.0
+        n = self.length(10_000)
+        data_path = self.scan_dir('xy')
+        write_cond(data_path, 10_000_000, n, amplifier, temp, 13, (xc, yc, z))
+
+        medium = Medium(273.15 + temp, FREQUENCY, 13)
+        sources = autd_transducers(*num_autd)
+        focus = np.array([xc, yc, z])
+        points = grid_points((xc - r / 2, xc + r / 2 + 1e-6), (yc - r / 2, yc + r / 2 + 1e-6), (z, z), resolution)
+        p = SOURCE_AMP * duty_amp(duty, self.alpha) * calc_pressure(sources, 1.0, focus_phases(sources, focus, medium), points, medium, Z_DIR)
+        for (x, y, pz), pi in zip(points, p):
+            self.add(os.path.join(data_path, f'x{x:.3f}y{y:.3f}z{pz:.3f}'), 'tone', np.abs(pi) * amplifier, np.angle(pi), n, 1e-7, 2000)
+
+    def saturation(self, configs=((1, 1), (2, 2), (3, 3)), zs=(150, 300, 500), cover=0.01, p_sat=5000.0):
+        '''
+        focal pressure vs. duty of d1 x d2 devices at each z: saturation_{d1}x{d2}_z{z} (duty 0-49, clipped by the
+        5 V range) and saturation_cover_{d1}x{d2}_z{z} (duty 0-255, microphone covered to attenuate by cover).
+        p_sat [Pa] is the scale of the nonlinear saturation of the focal pressure
+        '''
+        temp = 23.0
+        n = self.length(10_000)
+        medium = Medium(273.15 + temp, FREQUENCY, 21)
+        for d1, d2 in configs:
+            sources = autd_transducers(d1, d2)
+            for z in zs:
+                focus = np.array([AUTD_WIDTH * d1 / 2, AUTD_HEIGHT * d2 / 2, z])
+                p = SOURCE_AMP * np.abs(calc_pressure(sources, 1.0, focus_phases(sources, focus, medium), focus[np.newaxis], medium, Z_DIR)[0])
+                for prefix, duties, amplifier, att in [('saturation', range(50), 1.0, 1.0), ('saturation_cover', range(256), 100.0, cover)]:
+                    data_path = self.scan_dir('saturation', f'{prefix}_{d1}x{d2}_z{z}')
+                    write_cond(data_path, 10_000_000, n, amplifier, temp, 21, focus)
+                    for duty in duties:
+                        pf = p * duty_amp(duty, self.alpha)
+                        pf = pf / (1 + pf / p_sat)
+                        self.add(os.path.join(data_path, f'duty{duty}'), 'tone', pf * att * amplifier, 0.0, n, 1e-7, 5000)
+
+    def individual(self, num_autd=(3, 3), z=200.0, duty=10, amp_spread=0.1, phase_spread=0.2):
+        '''
+        each transducer driven alone and measured right above it, with individual amplitude and phase deviations
+        '''
+        temp, amplifier = 22.8, 10.0
+        n = self.length(10_000)
+        data_path = self.scan_dir('individual')
+        write_cond(data_path, 10_000_000, n, amplifier, temp, 13, (0, 0, z))
+        medium = Medium(273.15 + temp, FREQUENCY, 13)
+        rng = np.random.default_rng(self.seed)
+        sources = autd_transducers(*num_autd)
+        p0 = SOURCE_AMP * duty_amp(duty, self.alpha) * np.exp(-medium.attenuation * z) / z
+        amps = p0 * (1 + rng.normal(0, amp_spread, len(sources)))
+        phases = -medium.wavenumber * z + rng.normal(0, phase_spread, len(sources))
+        for idx, pos in enumerate(sources):
+            dev = idx // 249
+            x, y = pos[0] - (dev % num_autd[0]) * AUTD_WIDTH, pos[1] - (dev // num_autd[0]) * AUTD_HEIGHT
+            tr_path = self.scan_dir('individual', f'dev{dev}', f'tr{idx % 249}')
+            self.add(os.path.join(tr_path, f'x{x:.3f}y{y:.3f}z{z:.3f}'), 'tone', amps[idx] * amplifier, phases[idx], n, 1e-7, 50)
+
+    def single(self, z=200.0):
+        '''
+        single_amp, single_input and single_phase scans of one transducer
+        '''
+        temp = 23.0
+        medium = Medium(273.15 + temp, FREQUENCY, 19)
+        p0 = SOURCE_AMP * np.exp(-medium.attenuation * z) / z
+        base = -medium.wavenumber * z
+        duties = np.arange(256)
+
+        data_path = self.scan_dir('single_amp')
+        n = self.length(2_000)
+        write_cond(data_path, 2_000_000, n, 10, temp, 19, (0, 0, z))
+        for d, a in zip(duties, duty_amp(duties, self.alpha)):
+            self.add(os.path.join(data_path, f'amp{d}'), 'tone', p0 * a * 10, base, n, 5e-7, 500)
+
+        data_path = self.scan_dir('single_input')
+        n = self.length(20_000)
+        write_cond(data_path, 10_000_000, n, 10, temp, 19, (0, 0, z))
+        for d in duties:
+            self.add(os.path.join(data_path, f'input{d}'), 'pwm', d, 0.0, n, 1e-7)
+
+        data_path = self.scan_dir('single_phase')
+        write_cond(data_path, 10_000_000, n, 10, temp, 19, (0, 0, z))
+        for i in duties:
+            self.add(os.path.join(data_path, f'phase{i}'), 'tone', p0 * 10, base - 2 * np.pi * i / 256, n, 1e-7, 500)
+
+    def write(self, processes=None):
+        total = len(self.jobs)
+        with Pool(processes) as pool:
+            for c, _ in enumerate(pool.imap_unordered(write_job, self.jobs, 16)):
+                print_progress(c + 1, total)
+        print()
+        self.jobs = []
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='synthetic scans in the raw_data layout')
+    parser.add_argument('root', nargs='?', default='raw_data_synthetic')
+    parser.add_argument('--experiments', nargs='+', choices=EXPERIMENTS, default=EXPERIMENTS)
+    parser.add_argument('--xy-points', type=int, default=10201)
+    parser.add_argument('--devices', type=int, nargs=2, default=[3, 3], help='AUTD3 devices (x y) of the individual scan')
+    parser.add_argument('--samples', type=int, default=None, help='override the sample length of every capture')
+    parser.add_argument('--noise', type=float, default=2.0, help='noise standard deviation [mV]')
+    parser.add_argument('--alpha', type=float, default=ALPHA)
+    parser.add_argument('--compress', action='store_true', help='write .bin files like the compressor')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    gen = Generator(args.root, args.noise, args.alpha, args.samples, args.compress, args.seed)
+    if 'xy' in args.experiments:
+        gen.xy(args.xy_points)
+    if 'saturation' in args.experiments:
+        gen.saturation()
+    if 'individual' in args.experiments:
+        gen.individual(tuple(args.devices))
+    if 'single' in args.experiments:
+        gen.single()
+    gen.write(args.processes)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
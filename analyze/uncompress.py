@@ -4,27 +4,114 @@ Project: analyze
 Created Date: 17/02/2021
 Author: Shun Suzuki
 -----
-Last Modified: 21/02/2021
+Last Modified: 17/10/2026
 Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
 -----
 Copyright (c) 2021 Hapis Lab. All rights reserved.
 
 '''
 
+import io
+import posixpath
+import sys
 import zipfile
 import os
+from multiprocessing import Pool
+import numpy as np
+from bin_reader import decode_bin
+from csv_reader import parse_picoscope
+from scan_index import index_files
+from waveform_store import write_store
 
+_archives = {}
 
-def uncompress(src_path, dst_path):
+
+def find_scans(names, experiments=None):
+    '''
+    {scan directory in the archive: relative paths of its members}; a scan directory holds cond.txt,
+    nested directories (e.g. individual/dev*/tr*) belong to their scan root.
+    experiments (e.g. ['xy', 'saturation']) selects the scans having one of them as a path component
+    '''
+    roots = sorted(posixpath.dirname(name) for name in names if posixpath.basename(name) == 'cond.txt')
+    roots = [r for r in roots if not any(r.startswith(p + '/') for p in roots if p != r)]
+    if experiments is not None:
+        roots = [r for r in roots if any(e in r.split('/') for e in experiments)]
+
+    scans = {root: [] for root in roots}
+    for name in names:
+        if name.endswith('/'):
+            continue
+        for root in roots:
+            if name.startswith(root + '/'):
+                scans[root].append(name[len(root) + 1:])
+                break
+    return scans
+
+
+def uncompress(src_path, dst_path, experiments=None):
+    '''
+    extract the archive, or only the scans of the given experiments
+    '''
+    with zipfile.ZipFile(src_path) as f:
+        if experiments is None:
+            f.extractall(dst_path)
+            return
+        scans = find_scans(f.namelist(), experiments)
+        f.extractall(dst_path, members=[root + '/' + name for root, names in scans.items() for name in names])
+
+
+def read_member(args):
+    '''
+    samples of a csv (or .bin) member, read from the archive kept open in each worker process
+    '''
+    src_path, name = args
+    if src_path not in _archives:
+        _archives[src_path] = zipfile.ZipFile(src_path)
+    zf = _archives[src_path]
+    if name.endswith('.bin'):
+        return parse_picoscope(io.StringIO(decode_bin(zf.read(name)), newline=None))
+    with zf.open(name) as f:
+        return parse_picoscope(io.TextIOWrapper(f))
+
+
+def ingest(src_path, dst_path, experiments=None, dtype=np.float32, processes=None):
+    '''
+    pack the scans in the archive straight into waveform stores under dst_path, streaming the members
+    on all cores without extracting any csv file
+    '''
     with zipfile.ZipFile(src_path) as f:
-        f.extractall(dst_path)
+        scans = find_scans(f.namelist(), experiments)
+        conds = {root: f.read(root + '/cond.txt') for root in scans}
+
+    with Pool(processes) as pool:
+        for root, names in scans.items():
+            print(root)
+            data_path = os.path.join(dst_path, *root.split('/'))
+            os.makedirs(data_path, exist_ok=True)
+            with open(os.path.join(data_path, 'cond.txt'), 'wb') as f:
+                f.write(conds[root])
+
+            index = index_files(names)
+            if len(index) == 0:
+                continue
+            tasks = [(src_path, root + '/' + path) for path in index['path']]
+            n_samples = len(read_member(tasks[0]))
+            write_store(data_path, index, pool.imap(read_member, tasks, 8), n_samples, dtype)
 
 
 if __name__ == '__main__':
+    # python uncompress.py [--stream] [experiment ...]
+    args = sys.argv[1:]
+    stream = '--stream' in args
+    experiments = [a for a in args if a != '--stream'] or None
+
     os.makedirs('raw_data', exist_ok=True)
     data_path = '../data/data.zip'
     if os.path.isfile(data_path):
-        uncompress(data_path, 'raw_data')
+        if stream:
+            ingest(data_path, 'raw_data', experiments)
+        else:
+            uncompress(data_path, 'raw_data', experiments)
     else:
         dst_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
         dst_path = os.path.normpath(dst_path)
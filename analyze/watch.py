@@ -0,0 +1,89 @@
+'''
+File: watch.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import hashlib
+import os
+import sys
+import time
+from scan_index import get_index
+from checkpoint import stat_files
+import xy_field
+import saturation
+import individual_diff
+
+# kind of waveform files and partial update (data_path, settle) -> number of points of each scan
+SCANS = {
+    'xy': ('xyz', xy_field.calc_partial),
+    'saturation': ('duty', saturation.calc_partial),
+    'individual': ('xyz', individual_diff.calc_partial),
+}
+
+
+def settled_fingerprint(data_path, kind, settle):
+    '''
+    digest of the path, size and mtime of the files of kind not modified within the last settle seconds,
+    i.e. of what an update would process; it changes when a file settles or a settled file is rewritten
+    '''
+    paths = get_index(data_path, refresh=True).query(kind)['path'].tolist()
+    sizes, mtimes = stat_files(data_path, paths)
+    ready = (sizes >= 0) & (mtimes <= time.time_ns() - int(settle * 1e9))
+    h = hashlib.sha256()
+    for path, size, mtime, r in zip(paths, sizes.tolist(), mtimes.tolist(), ready.tolist()):
+        if r:
+            h.update(f'{path}:{size}:{mtime}\n'.encode())
+    return h.hexdigest()
+
+
+def watch(scan, data_path, interval=5.0, settle=1.0, idle_timeout=None, on_update=None):
+    '''
+    processes the files of a scan in progress as they arrive and refreshes its partial csv every interval seconds.
+    already processed files are kept in the checkpoint, so restarting the watch or running the final analysis
+    after the scan only processes what is new. stops on Ctrl+C or after idle_timeout seconds without new files
+    '''
+    kind, update = SCANS[scan]
+    processed = -1
+    fingerprint = None
+    last_change = time.monotonic()
+    try:
+        while True:
+            if os.path.isfile(os.path.join(data_path, 'cond.txt')):
+                # the points an update returns may be fewer than the files (filters of the scan, files still
+                # settling), so the files themselves tell whether there is anything new
+                current = settled_fingerprint(data_path, kind, settle)
+                if current != fingerprint:
+                    fingerprint = current
+                    processed = update(data_path, settle)
+                    last_change = time.monotonic()
+                    print(f'{scan}: {processed} points')
+                    if on_update is not None:
+                        on_update()
+            if idle_timeout is not None and time.monotonic() - last_change > idle_timeout:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return processed
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in SCANS:
+        print(f'usage: python watch.py [{"|".join(SCANS)}] data_path [interval]')
+        sys.exit(1)
+
+    scan = sys.argv[1]
+    interval = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+    on_update = None
+    if scan == 'xy':
+        os.makedirs('plot', exist_ok=True)
+        on_update = xy_field.plot_partial
+    watch(scan, sys.argv[2], interval, on_update=on_update)
@@ -0,0 +1,152 @@
+'''
+File: waveform_store.py
+Project: analyze
+Created Date: 17/10/2026
+Author: Shun Suzuki
+-----
+Last Modified: 17/10/2026
+Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
+-----
+Copyright (c) 2026 Hapis Lab. All rights reserved.
+
+'''
+
+import glob
+import os
+import sys
+import numpy as np
+import pandas as pd
+from shared import print_progress, get_40kHz_spectrum
+from scan_index import get_index
+from csv_reader import read_picoscope
+
+SAMPLES_FILE = 'waveforms.npy'
+INDEX_FILE = 'waveforms_index.csv'
+CHUNK = 1024
+
+
+def pack(data_path, dtype=np.float32):
+    '''
+    pack every waveform csv under data_path into waveforms.npy (N_points x N_samples) and waveforms_index.csv.
+    with dtype=np.int16, each row is quantized with its own scale stored in the index.
+    '''
+    index = get_index(data_path).files
+    if len(index) == 0:
+        raise ValueError(f'No waveform files found in {data_path}')
+
+    n_samples = len(read_picoscope(os.path.join(data_path, index.at[0, 'path'])))
+    waveforms = (read_picoscope(os.path.join(data_path, path), n=n_samples) for path in index['path'])
+    write_store(data_path, index, waveforms, n_samples, dtype)
+
+
+def write_store(data_path, index, waveforms, n_samples, dtype=np.float32):
+    '''
+    write the waveforms (an iterable in the order of index) into the store files of data_path
+    '''
+    index = index.copy()
+    total = len(index)
+    samples = np.lib.format.open_memmap(os.path.join(data_path, SAMPLES_FILE), mode='w+',
+                                        dtype=dtype, shape=(total, n_samples))
+    index['scale'] = 1.0
+
+    for i, (path, sound) in enumerate(zip(index['path'], waveforms)):
+        if len(sound) != n_samples:
+            raise ValueError(f'{path} has {len(sound)} samples, expected {n_samples}')
+
+        if np.issubdtype(dtype, np.integer):
+            max_v = np.abs(sound).max()
+            scale = max_v / np.iinfo(dtype).max if max_v > 0 else 1.0
+            samples[i] = np.round(sound / scale).astype(dtype)
+            index.at[i, 'scale'] = scale
+        else:
+            samples[i] = sound
+        print_progress(i + 1, total)
+    print()
+
+    samples.flush()
+    del samples
+    index.to_csv(os.path.join(data_path, INDEX_FILE))
+
+
+def has_store(data_path):
+    return os.path.isfile(os.path.join(data_path, SAMPLES_FILE)) and os.path.isfile(os.path.join(data_path, INDEX_FILE))
+
+
+class WaveformStore:
+    '''
+    read-only view of a packed scan directory; samples are memory-mapped, not copied
+    '''
+
+    def __init__(self, data_path):
+        self.path = data_path
+        self.cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
+        self.index = pd.read_csv(os.path.join(data_path, INDEX_FILE), index_col=0)
+        self.samples = np.load(os.path.join(data_path, SAMPLES_FILE), mmap_mode='r')
+
+    @property
+    def sample_rate(self):
+        return self.cond.at[0, 1]
+
+    @property
+    def mV_per_Pa(self):
+        return self.cond.at[2, 1]
+
+    @property
+    def scales(self):
+        return self.index['scale'].to_numpy()
+
+    def __len__(self):
+        return len(self.index)
+
+    def waveform(self, i):
+        if np.issubdtype(self.samples.dtype, np.integer):
+            return self.samples[i] * self.index.at[i, 'scale']
+        return self.samples[i]
+
+    def spectrum(self, index=None, method='dft'):
+        '''
+        complex 40 kHz component [mV] of the rows in index (all rows by default), in index order
+        '''
+        if index is None:
+            index = self.index
+        dt = 1.0 / self.sample_rate
+        rows = index.index.to_numpy()
+        spectrum = np.empty(len(rows), dtype=np.complex128)
+        for s in range(0, len(rows), CHUNK):
+            spectrum[s:s + CHUNK] = get_40kHz_spectrum(self.samples[rows[s:s + CHUNK]], dt, method)
+            print_progress(min(s + CHUNK, len(rows)), len(rows))
+        print()
+        return spectrum * index['scale'].to_numpy()
+
+    def select(self, kind=None, dev=None):
+        index = self.index
+        if kind is not None:
+            index = index[index['kind'] == kind]
+        if dev is not None:
+            index = index[index['dev'] == dev]
+        return index
+
+
+def open_store(data_path):
+    return WaveformStore(data_path) if has_store(data_path) else None
+
+
+def find_scan_dirs(root):
+    '''
+    directories holding cond.txt; nested directories (e.g. individual/dev*/tr*) are packed into their scan root
+    '''
+    if os.path.isfile(os.path.join(root, 'cond.txt')):
+        return [root]
+    scan_dirs = []
+    for path in sorted(glob.glob(os.path.join(root, '*'))):
+        if os.path.isdir(path):
+            scan_dirs.extend(find_scan_dirs(path))
+    return scan_dirs
+
+
+if __name__ == '__main__':
+    roots = sys.argv[1:] if len(sys.argv) > 1 else ['./raw_data']
+    for root in roots:
+        for data_path in find_scan_dirs(root):
+            print(data_path)
+            pack(data_path)
@@ -4,22 +4,23 @@ Project: analyze
 Created Date: 17/02/2021
 Author: Shun Suzuki
 -----
-Last Modified: 24/02/2021
+Last Modified: 17/10/2026
 Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
 -----
 Copyright (c) 2021 Hapis Lab. All rights reserved.
 
 '''
 
-from shared import setup_pyplot, get_40kHz_amp, print_progress
+from shared import setup_pyplot
+from loader import load_scan
+from result_cache import cached
 import math
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import mpl_toolkits.axes_grid1
 import os
-import glob
-import re
+
+DPI = 300
+ext = '.pdf'
 
 
 def plot_acoustic_field_2d(axes, acoustic_pressures_2d, observe_x, observe_y, resolution, ticks_step, cmap='jet'):
@@ -38,56 +39,51 @@ def plot_acoustic_field_2d(axes, acoustic_pressures_2d, observe_x, observe_y, re
     return heatmap
 
 
-def calc(data_path):
-    cond = pd.read_csv(filepath_or_buffer=os.path.join(data_path, 'cond.txt'), sep=",", header=None)
-    sample_rate = cond.at[0, 1]
+def calc_rms(data_path, settle=0.0):
+    cond, keys, spectrum = load_scan(data_path, 'xyz', settle=settle)
     mV_per_Pa = cond.at[2, 1]
-    dt = 1.0 / sample_rate
-
-    p = re.compile(r'x([+-]?\d+\.?\d+?)y([+-]?\d+\.?\d+?)z([+-]?\d+\.?\d+?).csv')
-
-    x_axis = []
-    y_axis = []
-
-    total = 0
-    for filepath in glob.glob(os.path.join(data_path, '*')):
-        m = p.match(filepath.split(os.path.sep)[-1])
-        if m is None:
-            continue
-
-        x = float(m.group(1))
-        y = float(m.group(2))
 
-        x_axis.append(x)
-        y_axis.append(y)
-        total += 1
+    amps = np.abs(spectrum) / mV_per_Pa / np.sqrt(2)
+    return pd.Series(amps, index=[keys['y'], keys['x']]).unstack().rename_axis(index=None, columns=None)
 
-    x_axis = sorted(set(x_axis))
-    y_axis = sorted(set(y_axis))
 
-    rms = pd.DataFrame(index=y_axis, columns=x_axis)
+def calc(data_path):
+    rms = cached('xy', [data_path], {'freq': 40e3}, lambda: calc_rms(data_path), [__file__])
+    rms.to_csv('xy.csv')
 
-    c = 0
-    for filepath in glob.glob(os.path.join(data_path, '*')):
-        m = p.match(filepath.split(os.path.sep)[-1])
-        if m is None:
-            continue
 
-        x = float(m.group(1))
-        y = float(m.group(2))
+def calc_partial(data_path, settle=1.0):
+    '''
+    writes xy.csv from the points measured so far and returns their number; NaN where not measured yet
+    '''
+    rms = calc_rms(data_path, settle)
+    rms.to_csv('xy.csv')
+    return int(rms.count().sum())
 
-        df = pd.read_csv(filepath_or_buffer=filepath, sep=",")
-        sound = df['  A Max [mV]']
 
-        rms.at[y, x] = get_40kHz_amp(sound, dt) / mV_per_Pa / np.sqrt(2)
-        c += 1
-        print_progress(c, total)
+def plot_partial(ext='.png'):
+    '''
+    heatmap of the whole (possibly partial) xy.csv, for monitoring a scan in progress
+    '''
+    import matplotlib.pyplot as plt
+    rms = pd.read_csv('xy.csv', index_col=0)
+    xs = rms.columns.to_numpy(dtype=float)
+    ys = rms.index.to_numpy(dtype=float)
 
-    print()
-    rms.to_csv('xy.csv')
+    fig = plt.figure(figsize=(7, 6))
+    axes = fig.add_subplot(111, aspect='equal')
+    heat_map = axes.pcolormesh(xs, ys, np.ma.masked_invalid(rms.to_numpy()), cmap='jet', shading='nearest')
+    axes.set_xlabel('x [mm]')
+    axes.set_ylabel('y [mm]')
+    axes.set_title(f'{rms.count().sum()} points, max {np.nanmax(rms.to_numpy()):.2f} Pa')
+    fig.colorbar(heat_map, ax=axes, label='RMS of acoustic pressure [Pa]')
+    fig.savefig(os.path.join('plot', 'xy_partial' + ext), bbox_inches='tight')
+    plt.close(fig)
 
 
 def plot(plot_r):
+    import matplotlib.pyplot as plt
+    import mpl_toolkits.axes_grid1
     rms = pd.read_csv('xy.csv', index_col=0)
     resolution = float(rms.columns[1]) - float(rms.columns[0])
 
@@ -123,7 +119,5 @@ if __name__ == '__main__':
     os.makedirs('plot', exist_ok=True)
     setup_pyplot()
 
-    DPI = 300
-    ext = '.pdf'
     calc('./raw_data/xy')
     plot(80)
@@ -4,7 +4,7 @@
  * Created Date: 17/02/2021
  * Author: Shun Suzuki
  * -----
- * Last Modified: 17/02/2021
+ * Last Modified: 17/10/2026
  * Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
  * -----
  * Copyright (c) 2021 Hapis Lab. All rights reserved.
@@ -14,8 +14,10 @@
 using PS4000Lib;
 using System;
 using System.Collections.Generic;
+using System.Globalization;
 using System.IO;
 using System.IO.Compression;
+using System.Linq;
 using System.Runtime.Serialization.Formatters.Binary;
 using System.Text;
 
@@ -25,6 +27,11 @@ namespace shared
     {
         PS4000 _pico;
         private bool disposedValue;
+        private double _dt;
+
+        public const int Harmonics = 3;
+        const float Frequency = 40e3f;
+        const string ChannelAColumn = "A Max [mV]"; // header of channel A in the csv of BlockData, PICO_COLUMN of analyze/csv_reader.py
 
         public PicoCnt()
         {
@@ -43,6 +50,7 @@ namespace shared
 
             _pico.SamplingRateHz = cond.SampleRateHz;
             _pico.BufferSize = cond.SampleLen;
+            _dt = 1.0 / cond.SampleRateHz;
         }
 
         static PS4000Lib.Range GetRange(int rangeMV)
@@ -63,17 +71,92 @@ namespace shared
         public void MeasureAndSave(bool triggered, string path, bool compress)
         {
             BlockData blockdata = triggered ? _pico.CollectBlockTriggered() : _pico.CollectBlockImmediate();
+            Save(blockdata.ToString(), path, compress);
+        }
+
+        // reduced acquisition: appends the phasors at 40 kHz x 1..Harmonics, the DC and the residual noise rms of channel A
+        // to a table opened with OpenTable (the layout of analyze/phasor_table.py), keyed by the relative path the raw file would have.
+        // the raw capture is saved as well when path is not null
+        public void MeasureAndReduce(bool triggered, StreamWriter table, string key, string path, bool compress)
+        {
+            BlockData blockdata = triggered ? _pico.CollectBlockTriggered() : _pico.CollectBlockImmediate();
+            var text = blockdata.ToString();
+            if (path != null)
+                Save(text, path, compress);
+
+            var row = Reduce(ParseChannel(text, ChannelAColumn), _dt, Harmonics);
+            table.WriteLine(key + "," + string.Join(",", row.Select(v => v.ToString("G6", CultureInfo.InvariantCulture))));
+        }
+
+        public static StreamWriter OpenTable(string dir)
+        {
+            var sw = new StreamWriter(Path.Join(dir, "phasors.csv"));
+            var columns = Enumerable.Range(1, Harmonics).SelectMany(h => new[] { $"h{h}_re", $"h{h}_im" });
+            sw.WriteLine("path," + string.Join(",", columns) + ",dc,noise");
+            return sw;
+        }
+
+        static void Save(string text, string path, bool compress)
+        {
             if (compress)
             {
                 using Stream stream = new FileStream(path + ".bin", FileMode.Create, FileAccess.Write);
                 using var gzs = new GZipStream(stream, CompressionMode.Compress, true);
                 var formatter = new BinaryFormatter();
-                formatter.Serialize(gzs, blockdata.ToString());
+                formatter.Serialize(gzs, text);
             }
             else
             {
-                File.WriteAllText(path + ".csv", blockdata.ToString());
+                File.WriteAllText(path + ".csv", text);
+            }
+        }
+
+        static double[] ParseChannel(string text, string column)
+        {
+            var lines = text.Split('\n');
+            var col = Array.FindIndex(lines[0].Split(','), c => c.Trim() == column);
+            if (col < 0)
+                throw new Exception($"Column \"{column}\" not found in the block data");
+            var samples = new List<double>();
+            foreach (var line in lines.Skip(1))
+            {
+                var v = line.Split(',');
+                if (v.Length > col && double.TryParse(v[col], NumberStyles.Float, CultureInfo.InvariantCulture, out var x))
+                    samples.Add(x);
+            }
+            return samples.ToArray();
+        }
+
+        // single-bin DFTs at the nearest bins, normalized by N / 2 like get_40kHz_spectrum
+        static double[] Reduce(double[] x, double dt, int harmonics)
+        {
+            var n = x.Length;
+            var dc = x.Average();
+            var residual = x.Select(v => v - dc).ToArray();
+            var row = new double[2 * harmonics + 2];
+            for (var h = 1; h <= harmonics; h++)
+            {
+                var k = Math.Round(h * Frequency * n * dt);
+                double re = 0, im = 0;
+                for (var i = 0; i < n; i++)
+                {
+                    var w = 2 * Math.PI * k * i / n;
+                    re += x[i] * Math.Cos(w);
+                    im -= x[i] * Math.Sin(w);
+                }
+                re /= n / 2.0;
+                im /= n / 2.0;
+                for (var i = 0; i < n; i++)
+                {
+                    var w = 2 * Math.PI * k * i / n;
+                    residual[i] -= re * Math.Cos(w) - im * Math.Sin(w);
+                }
+                row[2 * h - 2] = re;
+                row[2 * h - 1] = im;
             }
+            row[2 * harmonics] = dc;
+            row[2 * harmonics + 1] = Math.Sqrt(residual.Select(v => v * v).Average());
+            return row;
         }
 
         public void SetChannel(int ch, int rangeMV, int attenuation, short? triggerMV)
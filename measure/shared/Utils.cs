@@ -4,7 +4,7 @@
  * Created Date: 17/02/2021
  * Author: Shun Suzuki
  * -----
- * Last Modified: 17/02/2021
+ * Last Modified: 17/10/2026
  * Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
  * -----
  * Copyright (c) 2021 Hapis Lab. All rights reserved.
@@ -13,7 +13,9 @@
 
 using System;
 using System.Collections.Generic;
+using System.Globalization;
 using System.IO;
+using System.Linq;
 
 namespace shared
 {
@@ -42,5 +44,20 @@ namespace shared
                     foreach (var v1 in iter1)
                         yield return (v1, v2);
         }
+
+        // rows (index, x [mm], y [mm], z [mm], settle [ms]) of a plan file written by analyze/scan_plan.py
+        public static IEnumerable<(int, float, float, float, int)> ReadPlan(string path)
+        {
+            foreach (var line in File.ReadLines(path).Skip(1))
+            {
+                if (string.IsNullOrWhiteSpace(line)) continue;
+                var v = line.Split(',');
+                yield return (int.Parse(v[0]),
+                    float.Parse(v[1], CultureInfo.InvariantCulture),
+                    float.Parse(v[2], CultureInfo.InvariantCulture),
+                    float.Parse(v[3], CultureInfo.InvariantCulture),
+                    int.Parse(v[4]));
+            }
+        }
     }
 }
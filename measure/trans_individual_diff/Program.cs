@@ -4,7 +4,7 @@
  * Created Date: 19/02/2021
  * Author: Shun Suzuki
  * -----
- * Last Modified: 21/02/2021
+ * Last Modified: 17/10/2026
  * Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
  * -----
  * Copyright (c) 2021 Hapis Lab. All rights reserved.
@@ -27,56 +27,60 @@ namespace trans_individual_diff
             return (ty == 1) && ((tx == 1) || (tx == 2) || (tx == 16));
         }
 
-        static void Scan(AUTD3Cnt autd, byte duty, PicoCnt pico, RobotController robo, Conditions cond, int devNumX, int devNumY, float z, bool compress = false)
+        static void Scan(AUTD3Cnt autd, byte duty, PicoCnt pico, RobotController robo, Conditions cond, int devNumX, int devNumY, float z, bool compress = false, string planPath = null, bool reduce = false, int keepEvery = 100)
         {
-            var totalNum = devNumX * devNumY * 249;
+            var transX = Enumerable.Range(0, 18);
+            var transY = Enumerable.Range(0, 14);
+            var trans = Utils.Product(transX, transY).Where(t => !IsMissing(t.Item1, t.Item2)).ToArray();
+
+            var devX = Enumerable.Range(0, devNumX).Select(x => x * 192f);
+            var devY = Enumerable.Range(0, devNumY).Select(y => y * 151.4f);
+
+            // raster order with a fixed settle, unless a plan written by analyze/scan_plan.py is given
+            var plan = planPath == null
+                ? Utils.Product(devX, devY).SelectMany(d => trans.Select(t => (d.Item1 + t.Item1 * 10.16f, d.Item2 + t.Item2 * 10.16f)))
+                    .Select((p, k) => (k, p.Item1, p.Item2, z, 500)).ToArray()
+                : Utils.ReadPlan(planPath).ToArray();
+            var totalNum = plan.Length;
 
             var dataFolder = Utils.CreateFolderTimeStamped("individual");
 
             Console.WriteLine($"Total Scan Points: {totalNum}");
+            if (planPath != null)
+                Console.WriteLine($"Plan: {planPath}");
             Console.WriteLine($"Saved to {dataFolder}");
             Console.WriteLine("Connect Ch. A to microphone. conditions are ...");
             cond.Check();
             cond.Save(dataFolder);
+            // reduced scan: phasors.csv for every point, raw captures for every keepEvery-th point only
+            using var table = reduce ? PicoCnt.OpenTable(dataFolder) : null;
 
             Console.WriteLine("Start Scanning...");
-            var transX = Enumerable.Range(0, 18);
-            var transY = Enumerable.Range(0, 14);
-
-            var devX = Enumerable.Range(0, devNumX).Select(x => x * 192f);
-            var devY = Enumerable.Range(0, devNumY).Select(y => y * 151.4f);
-
-            int devIdx = 0;
-            int idx = 0;
-            foreach (var (dx, dy) in Utils.Product(devX, devY))
+            int i = 0;
+            foreach (var (idx, x, y, pz, settle) in plan)
             {
-                var df = Path.Join(dataFolder, $"dev{devIdx}");
-                Directory.CreateDirectory(df);
-
-                foreach (var (tx, ty) in Utils.Product(transX, transY))
-                {
-                    if (IsMissing(tx, ty)) continue;
-
-                    autd.TransTest(idx, duty, 0);
-                    Thread.Sleep(500);
-
-                    var tf = Path.Join(df, $"tr{idx % 249}");
-                    Directory.CreateDirectory(tf);
+                var (tx, ty) = trans[idx % 249];
+                var tr = $"dev{idx / 249}/tr{idx % 249}";
+                var keepRaw = !reduce || i % keepEvery == 0;
+                if (keepRaw)
+                    Directory.CreateDirectory(Path.Join(dataFolder, tr));
 
-                    float x = dx + tx * 10.16f;
-                    float y = dy + ty * 10.16f;
+                autd.TransTest(idx, duty, 0);
+                Thread.Sleep(500);
 
-                    Console.Write("\r{0, 3:d0}/{1, 3:d0} ({2, 3:f0}%)", idx, totalNum, 100.0 * idx / totalNum);
+                Console.Write("\r{0, 3:d0}/{1, 3:d0} ({2, 3:f0}%)", i, totalNum, 100.0 * i / totalNum);
 
-                    robo.MoveTo(x, y, z);
-                    Thread.Sleep(500);
+                robo.MoveTo(x, y, pz);
+                Thread.Sleep(settle);
 
-                    pico.MeasureAndSave(true, Path.Join(tf, $"x{(tx * 10.16f):F3}y{(ty * 10.16f):F3}z{z:F3}"), compress);
+                var name = $"x{(tx * 10.16f):F3}y{(ty * 10.16f):F3}z{pz:F3}";
+                if (reduce)
+                    pico.MeasureAndReduce(true, table, $"{tr}/{name}" + (compress ? ".bin" : ".csv"), keepRaw ? Path.Join(dataFolder, tr, name) : null, compress);
+                else
+                    pico.MeasureAndSave(true, Path.Join(dataFolder, tr, name), compress);
 
-                    autd.TransTest(idx, 0, 0);
-                    idx++;
-                }
-                devIdx++;
+                autd.TransTest(idx, 0, 0);
+                i++;
             }
 
             Console.WriteLine();
@@ -95,6 +99,8 @@ namespace trans_individual_diff
             float Z = 200;
 
             var compress = true;
+            var reduce = false;
+            var keepEvery = 100;
             var cond = new Conditions()
             {
                 SampleRateHz = 10_000_000,
@@ -131,7 +137,7 @@ namespace trans_individual_diff
             autd.Calibrate();
             autd.StaticMod(0xFF);
 
-            Scan(autd, 10, pico, robo, cond, NUM_AUTD_X, NUM_AUTD_Y, Z, compress);
+            Scan(autd, 10, pico, robo, cond, NUM_AUTD_X, NUM_AUTD_Y, Z, compress, args.Length > 0 ? args[0] : null, reduce, keepEvery);
 
             Console.WriteLine("Finish.");
             autd.Stop();
@@ -4,7 +4,7 @@
  * Created Date: 17/02/2021
  * Author: Shun Suzuki
  * -----
- * Last Modified: 17/02/2021
+ * Last Modified: 17/10/2026
  * Modified By: Shun Suzuki (suzuki@hapis.k.u-tokyo.ac.jp)
  * -----
  * Copyright (c) 2021 Hapis Lab. All rights reserved.
@@ -41,12 +41,16 @@ namespace xy_field
             Console.WriteLine($" ({points.Length})");
         }
 
-        static void Scan(PicoCnt pico, RobotController robo, Conditions cond, (float, float) xrange, (float, float) yrange, (float, float) zrange, float resolution, bool compress = false)
+        static void Scan(PicoCnt pico, RobotController robo, Conditions cond, (float, float) xrange, (float, float) yrange, (float, float) zrange, float resolution, bool compress = false, string planPath = null, bool reduce = false, int keepEvery = 100)
         {
             var scanX = ScanPoints(xrange, resolution);
             var scanY = ScanPoints(yrange, resolution);
             var scanZ = ScanPoints(zrange, resolution);
-            var totalNum = scanX.Length * scanY.Length * scanZ.Length;
+            // raster order with a fixed settle, unless a plan written by analyze/scan_plan.py is given
+            var plan = planPath == null
+                ? Utils.Product(scanX, scanY, scanZ).Select((p, k) => (k, p.Item1, p.Item2, p.Item3, 500)).ToArray()
+                : Utils.ReadPlan(planPath).ToArray();
+            var totalNum = plan.Length;
 
             var dataFolder = Utils.CreateFolderTimeStamped("xy");
 
@@ -58,22 +62,30 @@ namespace xy_field
             Console.Write($"\tz: ");
             ShowScanPoints(scanZ);
             Console.WriteLine($"Total Scan Points: {totalNum}");
+            if (planPath != null)
+                Console.WriteLine($"Plan: {planPath}");
             Console.WriteLine($"Saved to {dataFolder}");
             Console.WriteLine("Connect Ch. A to microphone. conditions are ...");
             cond.Check();
             cond.Save(dataFolder);
+            // reduced scan: phasors.csv for every point, raw captures for every keepEvery-th point only
+            using var table = reduce ? PicoCnt.OpenTable(dataFolder) : null;
 
             int i = 0;
             Console.WriteLine("Start Scanning...");
-            foreach (var (x, y, z) in Utils.Product(scanX, scanY, scanZ))
+            foreach (var (_, x, y, z, settle) in plan)
             {
                 Console.Write("{0, 3:d0}/{1, 3:d0} ({2, 3:f0}%)", i, totalNum, 100.0 * i / totalNum);
                 Console.SetCursorPosition(0, Console.CursorTop);
 
                 robo.MoveTo(x, y, z);
-                Thread.Sleep(500);
+                Thread.Sleep(settle);
 
-                pico.MeasureAndSave(false, Path.Join(dataFolder, $"x{x:F3}y{y:F3}z{z:F3}"), compress);
+                var name = $"x{x:F3}y{y:F3}z{z:F3}";
+                if (reduce)
+                    pico.MeasureAndReduce(false, table, name + (compress ? ".bin" : ".csv"), i % keepEvery == 0 ? Path.Join(dataFolder, name) : null, compress);
+                else
+                    pico.MeasureAndSave(false, Path.Join(dataFolder, name), compress);
                 i++;
             }
 
@@ -96,6 +108,8 @@ namespace xy_field
             float r = 1f;
 
             var compress = true;
+            var reduce = false;
+            var keepEvery = 100;
             var cond = new Conditions()
             {
                 SampleRateHz = 10_000_000,
@@ -133,7 +147,7 @@ namespace xy_field
             autd.SetWavelength(cond.Wavelength);
             autd.Focus(xc, yc, Z, 10);
 
-            Scan(pico, robo, cond, (xc - R / 2, xc + R / 2), (yc - R / 2, yc + R / 2), (Z, Z), r, compress);
+            Scan(pico, robo, cond, (xc - R / 2, xc + R / 2), (yc - R / 2, yc + R / 2), (Z, Z), r, compress, args.Length > 0 ? args[0] : null, reduce, keepEvery);
 
             Console.WriteLine("Finish.");
             autd.Stop();